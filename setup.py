@@ -91,6 +91,8 @@ setup(
     extras_require={
         'dev': ['check-manifest'],
         'test': ['coverage'],
+        'navigation': ['numpy'],
+        'dedup': ['xxhash'],
     },
 
     # If there are data files included in your packages that need to be
@@ -113,7 +115,12 @@ setup(
             'xritdump=xrit:dumpDataExecutable',
             'xritcat=xrit:catExecutable',
             'xritpdcs=xrit:printDCS',
-            'xritimg=xrit:dumpImageFile'
+            'xritimg=xrit:dumpImageFile',
+            'xrittext=xrit:textExecutable',
+            'xritorganize=xrit:organizeExecutable',
+            'xritpipeline=xrit:pipelineExecutable',
+            'xritindex=xrit:indexExecutable',
+            'xritsoak=xrit:soakExecutable'
         ],
     },
 )
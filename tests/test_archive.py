@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+import io, os, shutil, tarfile, tempfile, unittest, zipfile
+from xrit.archive import *
+from xrit.packetmanager import loadData, loadHeaderInfo, dumpImage
+from tests.xritfiles import buildFile, pattern, buildZipPayload, Output
+
+try:
+  import lzma
+except ImportError:
+  lzma = None
+
+class ArchiveTest(unittest.TestCase):
+  def setUp(self):
+    self.workdir = tempfile.mkdtemp()
+    # The EMWIN file goes last: its ZIP payload ends the archive with a zip directory
+    self.members = [
+      ("a.lrit", buildFile(pattern(3000))),
+      ("e.lrit", buildFile(buildZipPayload([("A_BUNDLE.TXT", b"hello")]), filetypecode=214, product=42, compression=10))
+    ]
+
+  def tearDown(self):
+    shutil.rmtree(self.workdir)
+
+  def _tar(self, mode, name):
+    path = os.path.join(self.workdir, name)
+    t = tarfile.open(path, mode)
+    for member, content in self.members:
+      info = tarfile.TarInfo(member)
+      info.size = len(content)
+      t.addfile(info, io.BytesIO(content))
+    t.close()
+    return path
+
+  def _check(self, path, kind):
+    self.assertEqual(archiveType(path), kind)
+    self.assertEqual([m.name for m in iterArchive(path)], ["a.lrit", "e.lrit"])
+    index = indexArchive(path)
+    self.assertEqual(loadData(openMember(index, "a.lrit")), pattern(3000))
+    self.assertEqual(loadHeaderInfo(openMember(index, "e.lrit")).filetypecode, 214)
+
+  def testTar(self):
+    self._check(self._tar("w", "x.tar"), "tar")
+
+  def testTarGz(self):
+    self._check(self._tar("w:gz", "x.tgz"), "tar.gz")
+
+  def testTarBz2(self):
+    self._check(self._tar("w:bz2", "x.tbz"), "tar.bz2")
+
+  @unittest.skipIf(lzma is None, "needs the lzma module")
+  def testTarXz(self):
+    self._check(self._tar("w:xz", "x.txz"), "tar.xz")
+
+  def testZip(self):
+    path = os.path.join(self.workdir, "x.zip")
+    z = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+    for member, content in self.members:
+      z.writestr(member, content)
+    z.close()
+    self._check(path, "zip")
+
+  def testDumpImageFromMember(self):
+    self.members = [("lrit/img.lrit", buildFile(pattern(100), product=16, compression=2))]
+    index = indexArchive(self._tar("w", "x.tar"))
+    cwd = os.getcwd()
+    os.chdir(self.workdir)
+    try:
+      with Output():
+        with openMember(index, "lrit/img.lrit") as m:
+          self.assertEqual(dumpImage(m), "img.jpg")
+    finally:
+      os.chdir(cwd)
+    with open(os.path.join(self.workdir, "img.jpg"), "rb") as f:
+      self.assertEqual(f.read(), pattern(100))
+
+  def testNotAnArchive(self):
+    path = os.path.join(self.workdir, "x.lrit")
+    with open(path, "wb") as f:
+      f.write(self.members[0][1])
+    self.assertRaises(ValueError, archiveType, path)
+
+if __name__ == '__main__':
+  unittest.main()
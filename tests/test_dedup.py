@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+import io, os, sys, shutil, struct, tempfile, unittest
+from xrit import dumpImageFile
+from xrit.dedup import *
+from tests.xritfiles import record, buildFile, pattern, Output
+
+class HashTest(unittest.TestCase):
+  def testRenamedRetransmission(self):
+    a = buildFile(pattern(1000), name=b"nameA.lrit")
+    b = buildFile(pattern(1000), name=b"nameBBBB.lrit")
+    self.assertEqual(hashFile(io.BytesIO(a)), hashFile(io.BytesIO(b)))
+
+  def testDifferentContent(self):
+    a = buildFile(pattern(1000, 1))
+    b = buildFile(pattern(1000, 2))
+    self.assertNotEqual(hashFile(io.BytesIO(a)), hashFile(io.BytesIO(b)))
+
+  def testBufferMatchesFile(self):
+    content = buildFile(pattern(1000))
+    self.assertEqual(hashBuffer(content, len(content) - 1000), hashFile(io.BytesIO(content), 100))
+
+class SeenSetTest(unittest.TestCase):
+  def setUp(self):
+    self.workdir = tempfile.mkdtemp()
+    self.filename = os.path.join(self.workdir, "seen")
+
+  def tearDown(self):
+    shutil.rmtree(self.workdir)
+
+  def testBoundedAndPersistent(self):
+    seen = SeenSet(self.filename, 3)
+    for key in range(10):
+      seen.add(key)
+    self.assertEqual(len(seen), 3)
+    self.assertFalse(0 in seen)
+    seen.close()
+    seen = SeenSet(self.filename, 3)
+    self.assertEqual(sorted(seen.keys), [7, 8, 9])
+    seen.close()
+
+  def testDeduplicator(self):
+    dedup = Deduplicator(self.filename)
+    key = hashFile(io.BytesIO(buildFile(pattern(100), name=b"a.lrit")))
+    self.assertFalse(dedup.checkHash(key))
+    self.assertFalse(dedup.check(io.BytesIO(buildFile(pattern(100), name=b"retransmitted.lrit"))))
+    dedup.commit(key)
+    self.assertTrue(dedup.check(io.BytesIO(buildFile(pattern(100), name=b"retransmitted.lrit"))))
+    self.assertEqual(dedup.duplicates, 1)
+    self.assertEqual(dedup.checked, 3)
+    dedup.close()
+
+  def testXritimgOnlyRemembersWrittenImages(self):
+    good = os.path.join(self.workdir, "good.lrit")
+    bad = os.path.join(self.workdir, "bad.lrit")
+    with open(good, "wb") as f:
+      f.write(buildFile(pattern(64), records=[record(1, struct.pack(">BHHB", 8, 8, 8, 0))]))
+    with open(bad, "wb") as f:
+      f.write(buildFile(pattern(64), compression=7))
+    argv = sys.argv
+    sys.argv = ["xritimg", "-s", self.filename, good, bad]
+    try:
+      with Output():
+        dumpImageFile()
+    finally:
+      sys.argv = argv
+    seen = SeenSet(self.filename)
+    self.assertEqual(len(seen), 1)
+    self.assertTrue(hashFile(good) in seen)
+    seen.close()
+
+if __name__ == '__main__':
+  unittest.main()
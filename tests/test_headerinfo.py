@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+import io, datetime, unittest
+from xrit.packetmanager import *
+from tests.xritfiles import record, buildFile, Output
+
+class HeaderInfoTest(unittest.TestCase):
+  def setUp(self):
+    records = [record(6, b"Time of frame start = 2020;Title = X;Flag\x00"), record(130, b"UIaUIbUI")]
+    self.content = buildFile(records=records, filetypecode=2, product=1, subproduct=0, days=0, ms=1000)
+
+  def testAccessors(self):
+    h = loadHeaderInfo(io.BytesIO(self.content))
+    self.assertEqual(h.filetypecode, 2)
+    self.assertEqual(h.product, "NOAA Text")
+    self.assertEqual(h.subproduct, "None")
+    self.assertEqual(h.timestamp, datetime.datetime(1958, 1, 1, 0, 0, 1))
+    self.assertEqual(h.ancillary, {"Time of frame start": "2020", "Title": "X", "Flag": None})
+    self.assertEqual(h.structured, ["a", "b"])
+    self.assertEqual(h.imageid, None)
+
+  def testPrintAncillaryText(self):
+    with Output() as out:
+      parseFile(io.BytesIO(self.content))
+    self.assertIn("Ancillary Text", out.text())
+    self.assertIn("Title = X", out.text())
+
+  def testPrintAncillaryTextOrder(self):
+    content = buildFile(records=[record(6, b"Z = 1;A = 2;Z = 3;Flag")], filetypecode=2, product=1)
+    with Output() as out:
+      parseFile(io.BytesIO(content))
+    lines = [i.strip() for i in out.text().splitlines()]
+    start = lines.index("Z = 1")
+    self.assertEqual(lines[start:start + 4], ["Z = 1", "A = 2", "Z = 3", "Flag"])
+
+if __name__ == '__main__':
+  unittest.main()
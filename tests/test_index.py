@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+import os, shutil, datetime, tempfile, unittest
+from xrit.index import *
+from tests.xritfiles import buildFile, pattern
+
+DAY = 21000
+
+def _time(ms):
+  return baseDate + datetime.timedelta(days=DAY, milliseconds=ms)
+
+class CaptureIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.workdir = tempfile.mkdtemp()
+    self.capture = os.path.join(self.workdir, "capture.bin")
+    # (product, subproduct, ms) of each file, in capture order
+    self.files = [(13, 1, 3000), (13, 2, 1000), (16, 1, 2000), (13, 1, 1000), (13, 1, 2000)]
+    with open(self.capture, "wb") as f:
+      for n, (product, subproduct, ms) in enumerate(self.files):
+        f.write(buildFile(pattern(100 + n, n), product=product, subproduct=subproduct, days=DAY, ms=ms))
+        if n == 1:
+          f.write(pattern(333, 9))
+    self.count = buildCaptureIndex(self.capture)
+    self.index = CaptureIndex(self.capture)
+
+  def tearDown(self):
+    self.index.close()
+    shutil.rmtree(self.workdir)
+
+  def testCount(self):
+    self.assertEqual(self.count, 5)
+    self.assertEqual(len(self.index), 5)
+    self.assertEqual(self.index.entry(2)["productId"], 16)
+
+  def testFindProductAndSubproduct(self):
+    entries = self.index.findProduct(13, 1)
+    self.assertEqual([e["entry"] for e in entries], [3, 4, 0])
+    self.assertEqual(entries[0]["datetime"], _time(1000))
+
+  def testFindProduct(self):
+    self.assertEqual([e["entry"] for e in self.index.findProduct(13)], [1, 3, 4, 0])
+    self.assertEqual(self.index.findProduct(99), [])
+
+  def testFindProductWindow(self):
+    entries = self.index.findProduct(13, 1, _time(1000), _time(3000))
+    self.assertEqual([e["entry"] for e in entries], [3, 4])
+    entries = self.index.findProduct(13, start=_time(2000))
+    self.assertEqual([e["entry"] for e in entries], [4, 0])
+
+  def testFindTime(self):
+    self.assertEqual([e["entry"] for e in self.index.findTime(_time(1000), _time(2000))], [1, 3])
+    self.assertEqual([e["entry"] for e in self.index.findTime(_time(2000), _time(3001))], [2, 4, 0])
+    self.assertEqual(self.index.findTime(_time(3001), _time(9000)), [])
+
+  def testReadFile(self):
+    for n in range(5):
+      headers, data = self.index.readFile(self.index.entry(n))
+      self.assertEqual(data, pattern(100 + n, n))
+      self.assertEqual(headers[0]["type"], 0)
+
+  def testEmptyCapture(self):
+    empty = os.path.join(self.workdir, "empty.bin")
+    open(empty, "wb").close()
+    self.assertEqual(buildCaptureIndex(empty), 0)
+    index = CaptureIndex(empty)
+    self.assertEqual(len(index), 0)
+    self.assertEqual(index.findTime(_time(0), _time(9000)), [])
+    self.assertEqual(index.findProduct(13), [])
+    index.close()
+
+  def testBadMagic(self):
+    with open(self.capture + ".bad", "wb") as f:
+      f.write(b"NOTANIDX" + b"\x00" * 8)
+    self.assertRaises(ValueError, CaptureIndex, self.capture, self.capture + ".bad")
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+import struct, unittest
+from xrit.packetmanager import decodeHeaders
+from tests.xritfiles import record, buildFile
+
+try:
+  import numpy as np
+  from xrit.navigation import *
+except ImportError:
+  np = None
+
+CFAC = 10233137
+
+def _headers(projname=b"GEOS(-075.0)", cfac=CFAC, lfac=CFAC, startline=0, columns=2200, lines=2200):
+  records = [
+    record(1, struct.pack(">BHHB", 8, columns, lines, 0)),
+    record(2, struct.pack(">32sIIII", projname, cfac, lfac, 1100, 1100)),
+    record(128, struct.pack(">7H", 1, 0, 0, startline, 1, 2200, 2200))
+  ]
+  headers, errors = decodeHeaders(buildFile(records=records), True)
+  return headers
+
+@unittest.skipIf(np is None, "needs numpy")
+class NavigationTest(unittest.TestCase):
+  def setUp(self):
+    self.nav = getNavigation(_headers())
+
+  def testRoundTrip(self):
+    columns, lines = np.meshgrid(np.arange(300, 1900, 97.5), np.arange(300, 1900, 101.25))
+    lat, lon = pixelToLatLon(columns, lines, self.nav)
+    self.assertFalse(np.isnan(lat).any())
+    column, line = latLonToPixel(lat, lon, self.nav)
+    self.assertTrue(np.abs(column - columns).max() < 0.01)
+    self.assertTrue(np.abs(line - lines).max() < 0.01)
+
+  def testSubSatellitePoint(self):
+    lat, lon = pixelToLatLon(1100, 1100, self.nav)
+    self.assertAlmostEqual(float(lat), 0.0, 6)
+    self.assertAlmostEqual(float(lon), -75.0, 6)
+
+  def testOffDisk(self):
+    lat, lon = pixelToLatLon(0, 0, self.nav)
+    self.assertTrue(np.isnan(lat) and np.isnan(lon))
+
+  def testFarSide(self):
+    column, line = latLonToPixel(np.array([0.0, 0.0]), np.array([105.0, -75.0]), self.nav)
+    self.assertTrue(np.isnan(column[0]) and np.isnan(line[0]))
+    self.assertFalse(np.isnan(column[1]))
+
+  def testSignedScalingFactors(self):
+    nav = getNavigation(_headers(cfac=0x100000000 - CFAC, lfac=0x100000000 - CFAC))
+    self.assertEqual(nav["cfac"], -CFAC)
+    self.assertEqual(nav["lfac"], -CFAC)
+    lat, lon = pixelToLatLon(1500, 700, nav)
+    flat, flon = pixelToLatLon(700, 1500, self.nav)
+    self.assertAlmostEqual(float(lat), float(flat), 6)
+    self.assertAlmostEqual(float(lon), float(flon), 6)
+    column, line = latLonToPixel(lat, lon, nav)
+    self.assertAlmostEqual(float(column), 1500, 3)
+    self.assertAlmostEqual(float(line), 700, 3)
+
+  def testSegmentStartLine(self):
+    lat, lon = getLatLonGrid(_headers(startline=500, lines=10))
+    self.assertEqual(lat.shape, (10, 2200))
+    elat, elon = pixelToLatLon(np.arange(2200), 503, self.nav)
+    np.testing.assert_allclose(lat[3], elat.astype(np.float32))
+    np.testing.assert_allclose(lon[3], elon.astype(np.float32))
+
+  def testNotGeostationary(self):
+    self.assertRaises(ValueError, getNavigation, _headers(projname=b"MERC(0.0)"))
+
+  def testNoNavigation(self):
+    headers, errors = decodeHeaders(buildFile(), True)
+    self.assertEqual(getNavigation(headers), None)
+    self.assertEqual(getLatLonGrid(headers), None)
+
+  def testGridCache(self):
+    lat, lon = getLatLonGrid(_headers(startline=100, lines=10))
+    clat, clon = getLatLonGrid(_headers(startline=100, lines=10))
+    self.assertTrue(lat is clat and lon is clon)
+    self.assertFalse(lat.flags.writeable)
+    self.assertFalse(lon.flags.writeable)
+    self.assertFalse(getLatLonGrid(_headers(startline=110, lines=10))[0] is lat)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+import os, shutil, struct, tempfile, unittest
+from xrit.packetmanager import *
+from tests.xritfiles import record, buildFile, pattern, Output
+
+TEMPLATE = "{productid}/{subid}/{filename}"
+
+class OrganizeTest(unittest.TestCase):
+  def setUp(self):
+    self.workdir = tempfile.mkdtemp()
+    self.indir = os.path.join(self.workdir, "in")
+    self.outdir = os.path.join(self.workdir, "out")
+    os.mkdir(self.indir)
+
+  def tearDown(self):
+    shutil.rmtree(self.workdir)
+
+  def _write(self, filename, content):
+    filename = os.path.join(self.indir, filename)
+    with open(filename, "wb") as f:
+      f.write(content)
+    return filename
+
+  def _tree(self, folder):
+    found = []
+    for root, dirs, files in os.walk(folder):
+      found.extend(os.path.relpath(os.path.join(root, i), folder) for i in files)
+    return sorted(found)
+
+  def testDefaultTemplate(self):
+    source = self._write("a.bin", buildFile(pattern(10), name=b"img.lrit"))
+    info = readFileInfo(source)
+    plan, skipped = planOrganize([source], self.outdir)
+    self.assertEqual(skipped, [])
+    expected = os.path.join(self.outdir, info["product"], info["subproduct"], info["date"].strftime("%Y-%m-%d"), "img.lrit")
+    self.assertEqual(plan, [(source, expected)])
+
+  def testCollisionsWithinPlan(self):
+    sources = [self._write("%s.bin" %n, buildFile(pattern(10, n), name=b"same.lrit")) for n in range(3)]
+    plan, skipped = planOrganize(sources, self.outdir, TEMPLATE)
+    folder = os.path.join(self.outdir, "13", "1")
+    self.assertEqual([t for s, t in plan], [os.path.join(folder, i) for i in ("same.lrit", "same_1.lrit", "same_2.lrit")])
+
+  def testCollisionsWithExistingFiles(self):
+    folder = os.path.join(self.outdir, "13", "1")
+    os.makedirs(folder)
+    for name in ("same.lrit", "same_1.lrit"):
+      open(os.path.join(folder, name), "wb").close()
+    source = self._write("a.bin", buildFile(pattern(10), name=b"same.lrit"))
+    plan, skipped = planOrganize([source], self.outdir, TEMPLATE)
+    self.assertEqual(plan, [(source, os.path.join(folder, "same_2.lrit"))])
+
+  def testAlreadyInPlace(self):
+    self._write("a.bin", buildFile(pattern(10), name=b"a.lrit"))
+    self._write("b.bin", buildFile(pattern(10, 1), name=b"b.lrit"))
+    with Output():
+      plan, skipped, failed = organizeFiles(self.indir, self.outdir, TEMPLATE)
+    self.assertEqual((len(plan), skipped, failed), (2, [], []))
+    self.assertEqual(self._tree(self.outdir), [os.path.join("13", "1", "a.lrit"), os.path.join("13", "1", "b.lrit")])
+    # A second run over the organized files finds them all in place
+    targets = [t for s, t in plan]
+    plan, skipped = planOrganize(targets, self.outdir, TEMPLATE)
+    self.assertEqual(plan, [])
+    self.assertEqual(skipped, [(t, "already in place") for t in targets])
+
+  def testCorruptedHeader(self):
+    good = self._write("good.bin", buildFile(pattern(10)))
+    bad = self._write("bad.bin", b"\x01" + buildFile(pattern(10)))
+    plan, skipped = planOrganize([bad, good], self.outdir, TEMPLATE)
+    self.assertEqual([s for s, t in plan], [good])
+    self.assertEqual(skipped, [(bad, "corrupted header")])
+
+  def testTemplateError(self):
+    # No Timestamp Record (type 5), so "date" is None
+    body = record(4, b"notime.lrit") + record(129, struct.pack(">4sHHHB", b"NOAA", 13, 1, 0, 0))
+    source = self._write("notime.bin", record(0, struct.pack(">BIQ", 0, 16 + len(body), 0)) + body)
+    plan, skipped = planOrganize([source], self.outdir, "{date:%Y}/{filename}")
+    self.assertEqual(plan, [])
+    self.assertEqual(len(skipped), 1)
+    self.assertTrue(skipped[0][1].startswith("cannot build target path"))
+    plan, skipped = planOrganize([source], self.outdir, "{missing}/{filename}")
+    self.assertEqual(plan, [])
+    self.assertTrue(skipped[0][1].startswith("cannot build target path"))
+
+  def testDryRun(self):
+    self._write("a.bin", buildFile(pattern(10), name=b"a.lrit"))
+    with Output() as output:
+      plan, skipped, failed = organizeFiles(self.indir, self.outdir, TEMPLATE, dryrun=True)
+    self.assertEqual(len(plan), 1)
+    self.assertTrue("a.bin -> " in output.text())
+    self.assertEqual(os.listdir(self.indir), ["a.bin"])
+    self.assertFalse(os.path.exists(self.outdir))
+
+  def testHardlink(self):
+    source = self._write("a.bin", buildFile(pattern(10), name=b"a.lrit"))
+    with Output():
+      plan, skipped, failed = organizeFiles(self.indir, self.outdir, TEMPLATE, link=True)
+    self.assertEqual(failed, [])
+    target = plan[0][1]
+    self.assertTrue(os.path.exists(source))
+    self.assertTrue(os.path.samefile(source, target))
+
+  def testApplyPlanFailure(self):
+    source = os.path.join(self.indir, "missing.bin")
+    failed = applyPlan([(source, os.path.join(self.outdir, "x.lrit"))])
+    self.assertEqual([s for s, reason in failed], [source])
+
+if __name__ == '__main__':
+  unittest.main()
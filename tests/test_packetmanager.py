@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+import io, struct, unittest
+from xrit.packetmanager import *
+from xrit.packetmanager import _StreamBuffer, _skipToPrimaryHeader
+from tests.xritfiles import record, buildFile, pattern, Output
+
+def _withHeaderLength(content, headerlength):
+  content = bytearray(content)
+  content[4:8] = struct.pack(">I", headerlength)
+  return bytes(content)
+
+def _scan(capture, resync=True, chunksize=65536):
+  return [(offset, len(headers) > 0, data, errors) for offset, headers, data, errors in iterStream(io.BytesIO(capture), resync, chunksize)]
+
+class DecodeHeadersTest(unittest.TestCase):
+  def testValidChain(self):
+    headers, errors = decodeHeaders(buildFile(b"x" * 10)[:-10])
+    self.assertEqual([i["type"] for i in headers], [0, 4, 5, 129])
+    self.assertEqual(errors, [])
+
+  def testZeroRecordSize(self):
+    content = bytearray(buildFile())
+    content[17:19] = b"\x00\x00"
+    headers, errors = decodeHeaders(bytes(content))
+    self.assertEqual([i["type"] for i in headers], [0])
+    self.assertEqual(len(errors), 1)
+    self.assertEqual(errors[0].offset, 16)
+    self.assertRaises(HeaderError, decodeHeaders, bytes(content), True)
+
+  def testOversizedRecordSize(self):
+    content = bytearray(buildFile())
+    content[17:19] = b"\xff\xff"
+    headers, errors = decodeHeaders(bytes(content))
+    self.assertEqual(len(errors), 1)
+    self.assertIn("invalid record size", str(errors[0]))
+
+  def testHeaderLengthPastBuffer(self):
+    content = buildFile()
+    headers, errors = decodeHeaders(_withHeaderLength(content, len(content) + 100))
+    self.assertEqual(len(errors), 1)
+    self.assertIn("exceeds", str(errors[0]))
+
+  def testType9Record(self):
+    headers, errors = decodeHeaders(buildFile(records=[record(9, b"abc\x00\x1fNAME.TXT\x00")]), True)
+    self.assertEqual(headers[1]["name"], b"NAME.TXT")
+
+class ReadHeaderChainTest(unittest.TestCase):
+  def testHugeHeaderLength(self):
+    content = _withHeaderLength(buildFile(b"data"), 0xFFFFFFF0)
+    self.assertRaises(HeaderError, readHeaderChain, io.BytesIO(content))
+    self.assertRaises(HeaderError, loadFile, io.BytesIO(content))
+    with Output():
+      self.assertEqual(loadData(io.BytesIO(content)), None)
+
+  def testLeavesFileAtData(self):
+    f = io.BytesIO(buildFile(b"data"))
+    readHeaderChain(f)
+    self.assertEqual(f.read(), b"data")
+
+class IterStreamTest(unittest.TestCase):
+  def setUp(self):
+    self.files = [buildFile(pattern(5000, 1), ms=1), buildFile(pattern(5000, 2), ms=2), buildFile(pattern(300, 3), ms=3)]
+
+  def testCleanStream(self):
+    entries = _scan(b"".join(self.files))
+    self.assertEqual([e[0] for e in entries], [0, len(self.files[0]), len(self.files[0]) + len(self.files[1])])
+    self.assertEqual([e[3] for e in entries], [[], [], []])
+
+  def testGarbageBetweenFiles(self):
+    garbage = pattern(700, 9)
+    entries = _scan(self.files[0] + garbage + self.files[1])
+    self.assertEqual([(e[0], e[1]) for e in entries], [(0, True), (len(self.files[0]), False), (len(self.files[0]) + len(garbage), True)])
+    self.assertEqual(entries[2][2], pattern(5000, 2))
+
+  def testGarbageWithoutResync(self):
+    entries = _scan(self.files[0] + pattern(700, 9) + self.files[1], False)
+    self.assertEqual([e[1] for e in entries], [True, False])
+
+  def testTruncatedData(self):
+    entries = _scan(self.files[0] + self.files[1][:200] + self.files[2])
+    self.assertEqual(len(entries), 3)
+    self.assertEqual(len(entries[1][3]), 1)
+    self.assertEqual(entries[2][0], len(self.files[0]) + 200)
+    self.assertEqual(entries[2][2], pattern(300, 3))
+
+  def testTruncatedHeaderChain(self):
+    entries = _scan(self.files[0] + self.files[1][:41] + self.files[2])
+    self.assertEqual([(e[0], e[1]) for e in entries], [(0, True), (len(self.files[0]), False), (len(self.files[0]) + 41, True)])
+
+  def testTruncatedLastFile(self):
+    entries = _scan(self.files[0] + self.files[1][:200])
+    self.assertEqual(len(entries), 2)
+    self.assertIn("truncated data", str(entries[1][3][0]))
+    self.assertEqual(len(entries[1][2]), 200 - (len(self.files[1]) - 5000))
+
+  def testHugeHeaderLength(self):
+    entries = _scan(self.files[0] + _withHeaderLength(self.files[1], 0xFFFFFFF0) + self.files[2])
+    self.assertEqual([e[1] for e in entries], [True, False, True])
+    self.assertEqual(entries[2][2], pattern(300, 3))
+
+  def testSmallChunks(self):
+    self.assertEqual(_scan(b"".join(self.files), chunksize=7), _scan(b"".join(self.files)))
+
+class SkipToPrimaryHeaderTest(unittest.TestCase):
+  def testDropsScannedBytes(self):
+    garbage = pattern(1 << 20)
+    class Reader(object):
+      def __init__(self, data):
+        self.f = io.BytesIO(data)
+        self.largest = 0
+      def read(self, n):
+        self.largest = max(self.largest, len(sb.data))
+        return self.f.read(n)
+    reader = Reader(garbage + buildFile(b"x"))
+    sb = _StreamBuffer(reader, 4096)
+    sb.fill(1)
+    self.assertEqual(_skipToPrimaryHeader(sb, 1), len(garbage))
+    self.assertEqual(sb.offset, len(garbage))
+    self.assertTrue(reader.largest <= 4 * 4096)
+
+class PrintHeadersTest(unittest.TestCase):
+  def testAllRecordTypes(self):
+    records = [
+      record(1, struct.pack(">BHHB", 8, 100, 100, 0)),
+      record(2, struct.pack(">32sIIII", b"GEOS(-075.0)", 1, 2, 3, 4)),
+      record(3, b"$HALFTONE:=8"),
+      record(7, b"key"),
+      record(9, b"\x1fNAME.TXT\x00"),
+      record(128, struct.pack(">7H", 1, 0, 0, 0, 1, 100, 100)),
+      record(130, b"UIaUIb"),
+      record(131, struct.pack(">HBB", 1, 2, 3)),
+      record(132, b"dcs.txt")
+    ]
+    with Output() as out:
+      parseFile(io.BytesIO(buildFile(records=records)), True, True)
+    for name in ("Primary Header", "Image Navigation Record", "Key Header", "Header Structured Record", "Rice Compression Record", "DCS Filename"):
+      self.assertIn(name, out.text())
+
+if __name__ == '__main__':
+  unittest.main()
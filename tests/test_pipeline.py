@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+import os, shutil, tempfile, unittest
+import multiprocessing
+from tests.xritfiles import buildFile, pattern, Output
+
+try:
+  import xrit.pipeline as pipeline
+except ImportError:
+  pipeline = None
+
+_FORK = pipeline is not None and multiprocessing.get_start_method() == "fork"
+
+def _dyingStage(*args):
+  os._exit(3)
+
+@unittest.skipIf(pipeline is None, "needs Python 3.8+")
+class PipelineTest(unittest.TestCase):
+  def setUp(self):
+    self.workdir = tempfile.mkdtemp()
+    self.outdir = os.path.join(self.workdir, "out")
+    os.mkdir(self.outdir)
+    self.files = []
+    for n in range(20):
+      filename = os.path.join(self.workdir, "f%s.lrit" %n)
+      with open(filename, "wb") as f:
+        f.write(buildFile(pattern(2000, n), filetypecode=128))
+      self.files.append(filename)
+
+  def tearDown(self):
+    shutil.rmtree(self.workdir)
+
+  def testRun(self):
+    with Output():
+      metrics = pipeline.runPipeline(self.files, self.outdir, decoders=2, queuesize=2)
+    self.assertEqual([s["items"] for s in metrics], [20, 20, 20, 20])
+    self.assertEqual(len(os.listdir(self.outdir)), 20)
+
+  def testFailedWritesAreRetried(self):
+    seenfile = os.path.join(self.workdir, "seen")
+    with Output():
+      metrics = pipeline.runPipeline(self.files, os.path.join(self.workdir, "missing"), seenfile=seenfile)
+    self.assertEqual(metrics[-1]["errors"], 20)
+    with Output():
+      metrics = pipeline.runPipeline(self.files + self.files[:1], self.outdir, seenfile=seenfile)
+    self.assertEqual(metrics[1]["duplicates"], 1)
+    self.assertEqual(len(os.listdir(self.outdir)), 20)
+    with Output():
+      metrics = pipeline.runPipeline(self.files, self.outdir, seenfile=seenfile)
+    self.assertEqual(metrics[1]["duplicates"], 20)
+
+  @unittest.skipIf(not _FORK, "needs the fork start method")
+  def testStageDies(self):
+    writeStage = pipeline._writeStage
+    pipeline._writeStage = _dyingStage
+    try:
+      with Output() as out:
+        pipeline.runPipeline(self.files, self.outdir, decoders=1, queuesize=2)
+    finally:
+      pipeline._writeStage = writeStage
+    self.assertIn("Pipeline stage died", out.text())
+    if os.path.isdir("/dev/shm"):
+      self.assertEqual([i for i in os.listdir("/dev/shm") if i.startswith("xr") and "_" in i], [])
+
+if __name__ == '__main__':
+  unittest.main()
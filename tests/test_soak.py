@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+import os, shutil, tempfile, unittest
+from xrit.soak import *
+from xrit.packetmanager import loadHeaderInfo, getCompression
+from tests.xritfiles import Output
+
+class SoakTest(unittest.TestCase):
+  def testSyntheticCorpusMix(self):
+    workdir = tempfile.mkdtemp()
+    try:
+      types = set()
+      compressions = set()
+      for filename in buildSyntheticCorpus(workdir, 10):
+        headers = loadHeaderInfo(filename).headers
+        types.update(i["type"] for i in headers)
+        compressions.add(getCompression(headers))
+    finally:
+      shutil.rmtree(workdir)
+    for type in (1, 2, 4, 5, 6, 128, 129, 130):
+      self.assertIn(type, types)
+    self.assertIn(10, compressions)
+
+  def testShortRun(self):
+    before = set(os.listdir(tempfile.gettempdir()))
+    with Output():
+      final = runSoak(duration=0.5, interval=10, synthetic=10)
+    self.assertTrue(final["files"] > 0)
+    self.assertEqual(final["errors"], {})
+    self.assertEqual(set(os.listdir(tempfile.gettempdir())) - before, set())
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+import io, os, shutil, struct, tempfile, unittest
+from xrit.packetmanager import *
+from tests.xritfiles import buildFile, buildZipPayload, Output
+
+BULLETIN = b"\x01\r\r\nSXUS72 KWBC 191200\r\r\nSVRGSG\r\r\nTEXT\r\r\n\x03"
+
+class TextProductsTest(unittest.TestCase):
+  def setUp(self):
+    self.outdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.outdir)
+
+  def _write(self, name, content):
+    filename = os.path.join(self.outdir, name)
+    with open(filename, "wb") as f:
+      f.write(content)
+    return filename
+
+  def testSplitBulletins(self):
+    self.assertEqual(splitBulletins(b"junk" + BULLETIN + BULLETIN), [BULLETIN, BULLETIN])
+    self.assertEqual(getBulletinName(BULLETIN), "SXUS72_KWBC_191200_SVRGSG.TXT")
+
+  def testZipPayload(self):
+    headers, data = loadFile(io.BytesIO(buildFile(buildZipPayload([("A_BUNDLE.TXT", b"hello")]), filetypecode=214, product=42, compression=10)))
+    self.assertTrue(isTextFile(headers))
+    self.assertEqual(getTextProducts(headers, data), [("A_BUNDLE.TXT", b"hello")])
+
+  def testCollidingNames(self):
+    products = os.path.join(self.outdir, "products")
+    os.mkdir(products)
+    filenames = [self._write("t%s.lrit" %i, buildFile(BULLETIN + BULLETIN, filetypecode=2, product=1, name=None)) for i in range(3)]
+    filenames.append(self._write("plain.lrit", buildFile(b"no bulletin", filetypecode=2, product=1, name=None)))
+    filenames.append(self._write("plain2.lrit", buildFile(b"no bulletin", filetypecode=2, product=1, name=None)))
+    self.assertEqual(extractTextProducts(filenames, products, batchsize=2), 8)
+    self.assertEqual(len(os.listdir(products)), 8)
+    self.assertIn("text_1.TXT", os.listdir(products))
+
+  def _emwin(self, name, payload, flags=0, method=None):
+    # Patches the central directory entry, which is what zipfile checks when reading
+    payload = bytearray(payload)
+    pos = payload.find(b"PK\x01\x02")
+    payload[pos + 8:pos + 10] = struct.pack("<H", flags)
+    if method is not None:
+      payload[pos + 10:pos + 12] = struct.pack("<H", method)
+    return self._write(name, buildFile(bytes(payload), filetypecode=214, product=42, compression=10, name=None))
+
+  def testUnsupportedZipPayloads(self):
+    products = os.path.join(self.outdir, "products")
+    os.mkdir(products)
+    payload = buildZipPayload([("A_BUNDLE.TXT", b"hello")])
+    filenames = [
+      self._emwin("good.lrit", payload),
+      self._emwin("method.lrit", payload, method=99),
+      self._emwin("encrypted.lrit", payload, flags=1),
+      self._emwin("good2.lrit", payload)
+    ]
+    with Output() as out:
+      self.assertEqual(extractTextProducts(filenames, products), 2)
+    self.assertEqual(out.text().count("Unsupported ZIP payload"), 2)
+    self.assertEqual(sorted(os.listdir(products)), ["A_BUNDLE.TXT", "A_BUNDLE_1.TXT"])
+
+  def testBatchFlushedOnError(self):
+    products = os.path.join(self.outdir, "products")
+    os.mkdir(products)
+    good = self._write("t.lrit", buildFile(BULLETIN + BULLETIN, filetypecode=2, product=1, name=None))
+    def filenames():
+      yield good
+      raise KeyboardInterrupt()
+    self.assertRaises(KeyboardInterrupt, extractTextProducts, filenames(), products)
+    self.assertEqual(len(os.listdir(products)), 2)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+import sys
+from xrit.soak import buildRecord as record, buildFile, buildZipPayload
+
+'''
+  Test fixtures. The synthetic lrit/hrit file builders are the ones of the soak harness
+'''
+
+def pattern(size, seed=0):
+  '''
+    Returns "size" bytes that never contain a primary header signature
+  '''
+  return bytes(bytearray((i * 7 + seed) % 251 + 1 for i in range(size)))
+
+class Output(object):
+  '''
+    Collects what is printed while in a "with" block
+  '''
+  def __enter__(self):
+    self.parts = []
+    self.stdout = sys.stdout
+    sys.stdout = self
+    return self
+
+  def __exit__(self, *args):
+    sys.stdout = self.stdout
+
+  def write(self, text):
+    self.parts.append(text)
+
+  def flush(self):
+    pass
+
+  def text(self):
+    return "".join(self.parts)
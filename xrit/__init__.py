@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-import sys
+import sys, os
 from xrit.packetmanager import *
 
 def __printDisclaimer():
@@ -28,12 +28,22 @@ def parseFileExecutable():
     print("   xritparse file1.lrit [file2.lrit]")
     print("       -h    Print Structured Header Record")
     print("       -i    Print Image Data Record")
+    print("       -s    Treat files as streams of concatenated files and skip corrupted regions")
+    print("       -a    Treat files as tar (gz, bz2, xz) / zip archives and parse all their members")
   else:
     for i in range(len(files)):
       filename = files[i]
       print("Parsing file %s" % filename)
       try:
-        parseFile(filename, "h" in arguments, "i" in arguments)
+        if "a" in arguments:
+          from xrit.archive import iterArchive
+          for member in iterArchive(filename):
+            print("Parsing member %s" % member.name)
+            parseFile(member, "h" in arguments, "i" in arguments)
+        elif "s" in arguments:
+          parseStream(filename, "h" in arguments, "i" in arguments)
+        else:
+          parseFile(filename, "h" in arguments, "i" in arguments)
       except Exception as e:
         print("Error parsing file %s: %s" %(filename, e))
 
@@ -62,6 +72,126 @@ def catExecutable():
     filename = sys.argv[1]
     sys.stdout.write(loadData(filename))
 
+def textExecutable():
+  argc = len(sys.argv) -1
+  if argc < 2:
+    print("xRIT Text Extractor")
+    print("   * This program extracts the Text, Messages and EMWIN products from HRIT/LRIT files")
+    __printDisclaimer()
+    print("Usage: ")
+    print("   xrittext outputdir filename.lrit [filename2.lrit] ...")
+    print("   xrittext outputdir -     Reads the filenames from stdin")
+  else:
+    outputdir = sys.argv[1]
+    if sys.argv[2] == "-":
+      files = (i.strip() for i in sys.stdin if len(i.strip()) > 0)
+    else:
+      files = sys.argv[2:]
+    count = extractTextProducts(files, outputdir)
+    print("Extracted %s products to %s" %(count, outputdir))
+
+def organizeExecutable():
+  args = sys.argv[1:]
+  arguments = []
+  template = DEFAULT_ORGANIZE_TEMPLATE
+  folders = []
+  while len(args) > 0:
+    arg = args.pop(0)
+    if arg == "-t" and len(args) > 0:
+      template = args.pop(0)
+    elif arg[:1] == "-":
+      for i in arg[1:]:
+        arguments.append(i)
+    else:
+      folders.append(arg)
+
+  if len(folders) == 0 or len(folders) > 2:
+    print("xRIT File Organizer")
+    print("   * This program renames all HRIT/LRIT files in a folder using their headers")
+    __printDisclaimer()
+    print("Usage: ")
+    print("   xritorganize [-nl] [-t template] folder [outputfolder]")
+    print("       -n    Dry run, only print what would be done")
+    print("       -l    Create hardlinks instead of renaming")
+    print("       -t    Target path template. Default: %s" %DEFAULT_ORGANIZE_TEMPLATE)
+    print("             Fields: product, subproduct, productid, subid, date, imageid, sequence, filename, name, ext")
+  else:
+    outdir = folders[1] if len(folders) == 2 else None
+    organizeFiles(folders[0], outdir, template, "l" in arguments, "n" in arguments)
+
+def pipelineExecutable():
+  args = sys.argv[1:]
+  decoders = 1
+  seenfile = None
+  while len(args) > 1 and args[0] in ("-j", "-s"):
+    if args[0] == "-j":
+      decoders = int(args[1])
+    else:
+      seenfile = args[1]
+    args = args[2:]
+
+  if len(args) < 2:
+    print("xRIT Pipeline")
+    print("   * This program reads, parses, decodes and writes HRIT/LRIT files in parallel processes")
+    __printDisclaimer()
+    print("Usage: ")
+    print("   xritpipeline [-j decoders] [-s seenfile] outputdir filename.lrit [filename2.lrit] ...")
+    print("   xritpipeline [-j decoders] [-s seenfile] outputdir -     Reads the filenames from stdin")
+    print("       -j    Number of decoding processes")
+    print("       -s    Skip files already seen, keeping the content hashes in seenfile")
+  else:
+    from xrit.pipeline import runPipeline, printMetrics
+    outputdir = args[0]
+    if args[1] == "-":
+      files = [i.strip() for i in sys.stdin if len(i.strip()) > 0]
+    else:
+      files = args[1:]
+    printMetrics(runPipeline(files, outputdir, decoders, seenfile=seenfile))
+
+def indexExecutable():
+  argc = len(sys.argv) -1
+  if argc == 0:
+    print("xRIT Capture Indexer")
+    print("   * This program writes a sidecar index (.xidx) for captures of concatenated HRIT/LRIT files")
+    __printDisclaimer()
+    print("Usage: ")
+    print("   xritindex capture.bin [capture2.bin] ...")
+  else:
+    from xrit.index import buildCaptureIndex
+    for i in range(argc):
+      filename = sys.argv[i+1]
+      print("Indexed %s files in %s" %(buildCaptureIndex(filename), filename))
+
+def soakExecutable():
+  args = sys.argv[1:]
+  options = {"-d": 3600, "-r": None, "-i": 60, "-n": 100}
+  while len(args) > 1 and args[0] in options:
+    options[args[0]] = float(args[1])
+    args = args[2:]
+
+  if len(args) == 0:
+    print("xRIT Soak Test")
+    print("   * This program replays HRIT/LRIT files through the parser, DCS and image decoders and")
+    print("     reports latency, throughput, memory growth and open file handles")
+    __printDisclaimer()
+    print("Usage: ")
+    print("   xritsoak [-d seconds] [-r files/s] [-i seconds] [-n count] folder | filename.lrit ... | -")
+    print("       -d    Duration of the test. Default: 3600")
+    print("       -r    Files per second. Default: as fast as possible")
+    print("       -i    Seconds between reports. Default: 60")
+    print("       -n    Number of synthetic files when the corpus is -. Default: 100")
+  else:
+    from xrit.soak import runSoak
+    files = []
+    for i in args:
+      if i == "-":
+        continue
+      if os.path.isdir(i):
+        files += sorted(os.path.join(i, k) for k in os.listdir(i) if os.path.isfile(os.path.join(i, k)))
+      else:
+        files.append(i)
+    runSoak(files, options["-d"], options["-r"], options["-i"], int(options["-n"]))
+
 def printDCS():
   argc = len(sys.argv) -1
   if argc != 1:
@@ -74,22 +204,42 @@ def printDCS():
     filename = sys.argv[1]
     data = loadData(filename)
     h, t = parseDCS(data)
-    print("Header: %s" %h)
-    print(" Address       Date / Time      Status  Signal  Frequency Offset  MIN  DQN  Channel  Source  ")
-    for i in t:
-      print(" %8s  %19s    %1s     %2s dB          %2s          %1s    %1s    %4s      %2s    " % (i["address"], i["datetime"], i["status"], i["signal"], i["frequencyoffset"], i["modindexnormal"], i["dataqualnominal"], i["channel"], i["sourcecode"]))
+    for line in formatDCS(h, t):
+      print(line)
 
 def binary(num, length=8):
   return format(num, '#0{}b'.format(length + 2))
 
 def dumpImageFile():
-  argc = len(sys.argv) -1
-  if argc == 0:
+  args = sys.argv[1:]
+  seenfile = None
+  if len(args) > 1 and args[0] == "-s":
+    seenfile = args[1]
+    args = args[2:]
+
+  if len(args) == 0:
     print("xRIT Dump Image")
     print("   * This program dumps an image file from LRIT")
     __printDisclaimer()
     print("Usage: ")
-    print("   xritimg filename.lrit [filename2.lrit] ...")
+    print("   xritimg [-s seenfile] filename.lrit [filename2.lrit] ...")
+    print("       -s    Skip files already seen, keeping the content hashes in seenfile")
+  elif seenfile is None:
+    for filename in args:
+      dumpImage(filename)
   else:
-    for i in range(argc):
-      dumpImage(sys.argv[i+1])
\ No newline at end of file
+    from xrit.dedup import Deduplicator, hashFile
+    dedup = Deduplicator(seenfile)
+    for filename in args:
+      try:
+        key = hashFile(filename)
+      except (IOError, HeaderError):
+        key = None
+      if key is not None and dedup.checkHash(key):
+        print("Skipping duplicate %s" %filename)
+        continue
+      # Only remember files whose image was actually written, so failures are retried
+      if dumpImage(filename) is not None and key is not None:
+        dedup.commit(key)
+    dedup.close()
+    print("%s duplicates in %s files (%.1f%%)" %(dedup.duplicates, dedup.checked, dedup.rate() * 100))
\ No newline at end of file
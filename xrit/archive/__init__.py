@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+import os, io, json, struct, gzip, bz2, tarfile, zipfile, zlib
+
+try:
+  import lzma
+except ImportError:
+  lzma = None
+
+'''
+  Reads lrit/hrit files directly from tar (plain, gzip, bzip2 or xz compressed) and zip archives.
+  The members are file-like objects accepted by parseFile, loadData, loadFile,
+  loadHeaderInfo and dumpImage from xrit.packetmanager.
+'''
+
+class ArchiveMember(object):
+  '''
+    Read only file-like view of "size" bytes of "f" named after the archive member
+  '''
+  def __init__(self, f, name, size):
+    self.f = f
+    self.name = name
+    self.size = size
+    self.remaining = size
+
+  def read(self, n=-1):
+    if n is None or n < 0 or n > self.remaining:
+      n = self.remaining
+    data = self.f.read(n)
+    self.remaining -= len(data)
+    return data
+
+  def close(self):
+    self.f.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+'''
+  Openers of the compressed tar archives, their offsets refer to the decompressed stream
+'''
+_TAR_OPENERS = {
+  "tar.gz": gzip.open,
+  "tar.bz2": bz2.BZ2File
+}
+if lzma is not None:
+  _TAR_OPENERS["tar.xz"] = lzma.open
+
+def archiveType(path):
+  '''
+    Returns "zip", "tar.gz", "tar.bz2", "tar.xz" or "tar" for the archive at "path", from the
+    magic bytes at its start. Raises ValueError for any other kind of file
+  '''
+  with open(path, "rb") as f:
+    magic = f.read(262)
+  if magic[:4] in (b"PK\x03\x04", b"PK\x05\x06"):
+    return "zip"
+  if magic[:2] == b"\x1f\x8b":
+    return "tar.gz"
+  if magic[:3] == b"BZh":
+    return "tar.bz2"
+  if magic[:6] == b"\xfd7zXZ\x00":
+    if lzma is None:
+      raise ValueError("%s is xz compressed and the lzma module is not available" %path)
+    return "tar.xz"
+  # Old tar archives have no "ustar" magic, fall back to checking the header checksum
+  if magic[257:262] == b"ustar" or tarfile.is_tarfile(path):
+    return "tar"
+  raise ValueError("%s is not a tar or zip archive" %path)
+
+def iterArchive(path):
+  '''
+    Iterates over the regular files of an archive in a single sequential pass, without extracting
+    them. Yields an ArchiveMember for each one, which is only valid until the next iteration.
+  '''
+  if archiveType(path) == "zip":
+    z = zipfile.ZipFile(path)
+    try:
+      for info in z.infolist():
+        if info.filename.endswith("/"):
+          continue
+        member = ArchiveMember(z.open(info), info.filename, info.file_size)
+        yield member
+        member.close()
+    finally:
+      z.close()
+  else:
+    t = tarfile.open(path, "r|*")
+    try:
+      for info in t:
+        if not info.isfile():
+          continue
+        yield ArchiveMember(t.extractfile(info), info.name, info.size)
+    finally:
+      t.close()
+
+def indexArchive(path):
+  '''
+    Builds an index of the member offsets of an archive, so members can be opened with
+    openMember without scanning the archive again. For tar archives (compressed or not) this
+    is one sequential pass over the headers. For zip archives only the central directory and
+    the local headers are read.
+  '''
+  kind = archiveType(path)
+  members = {}
+  if kind == "zip":
+    z = zipfile.ZipFile(path)
+    f = open(path, "rb")
+    try:
+      for info in z.infolist():
+        if info.filename.endswith("/"):
+          continue
+        # The local header extra field may differ from the central directory one
+        f.seek(info.header_offset)
+        n, m = struct.unpack("<HH", f.read(30)[26:30])
+        members[info.filename] = {
+          "offset": info.header_offset + 30 + n + m,
+          "size": info.file_size,
+          "stored": info.compress_size,
+          "compression": info.compress_type
+        }
+    finally:
+      f.close()
+      z.close()
+  else:
+    t = tarfile.open(path, "r|*")
+    try:
+      for info in t:
+        if info.isfile():
+          members[info.name] = {"offset": info.offset_data, "size": info.size, "stored": info.size, "compression": 0}
+    finally:
+      t.close()
+  return {"archive": os.path.abspath(path), "type": kind, "members": members}
+
+def openMember(index, name):
+  '''
+    Opens the member "name" of an indexed archive and returns an ArchiveMember.
+    Plain tar and zip members are reached with a single seek. Members of compressed tar
+    archives still have to be decompressed from the start of the archive up to their offset.
+    Raises KeyError if there is no such member. The member owns its file, so open it in a
+    "with" block (or close it) once done.
+  '''
+  entry = index["members"][name]
+  if index["type"] == "zip" and entry["compression"] not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+    z = zipfile.ZipFile(index["archive"])
+    data = z.read(name)
+    z.close()
+    return ArchiveMember(io.BytesIO(data), name, entry["size"])
+
+  if index["type"] in _TAR_OPENERS:
+    f = _TAR_OPENERS[index["type"]](index["archive"], "rb")
+  else:
+    f = open(index["archive"], "rb")
+  f.seek(entry["offset"])
+
+  if index["type"] == "zip" and entry["compression"] == zipfile.ZIP_DEFLATED:
+    raw = f.read(entry["stored"])
+    f.close()
+    return ArchiveMember(io.BytesIO(zlib.decompress(raw, -15)), name, entry["size"])
+  return ArchiveMember(f, name, entry["size"])
+
+def saveArchiveIndex(index, filename):
+  '''
+    Saves an archive index as JSON
+  '''
+  with open(filename, "w") as f:
+    json.dump(index, f)
+
+def loadArchiveIndex(filename):
+  '''
+    Loads an archive index saved by saveArchiveIndex
+  '''
+  with open(filename, "r") as f:
+    return json.load(f)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+import os, struct, zlib
+from collections import deque
+from xrit.packetmanager import readHeaderChain
+
+try:
+  import xxhash
+except ImportError:
+  xxhash = None
+
+'''
+  Duplicate detection of lrit/hrit files by content hash.
+  The hash covers the header chain and the data section, except the Annotation Record
+  (type 4) and the header length of the primary header, since the same segment is
+  retransmitted under different names. It is a 64 bit
+  xxhash when the module is installed, otherwise CRC32 and Adler32 combined.
+'''
+
+class _CRCHash(object):
+  '''
+    Fallback 64 bit hash with the xxhash interface
+  '''
+  def __init__(self):
+    self.crc = 0
+    self.adler = 1
+
+  def update(self, data):
+    self.crc = zlib.crc32(data, self.crc)
+    self.adler = zlib.adler32(data, self.adler)
+
+  def intdigest(self):
+    return ((self.crc & 0xFFFFFFFF) << 32) | (self.adler & 0xFFFFFFFF)
+
+def _newHash():
+  return xxhash.xxh64() if xxhash is not None else _CRCHash()
+
+def _hashHeaders(h, hdata):
+  offset = 0
+  while offset < len(hdata):
+    size = struct.unpack_from(">H", hdata, offset+1)[0] if offset + 3 <= len(hdata) else 0
+    if size < 3:
+      # Broken chain, hash whatever is left as is
+      h.update(hdata[offset:])
+      return
+    type = bytearray(hdata[offset:offset+1])[0]
+    if type == 0 and size == 16:
+      # The header length depends on the Annotation Record, leave it out
+      h.update(hdata[offset:offset+4])
+      h.update(hdata[offset+8:offset+16])
+    elif type != 4:
+      h.update(hdata[offset:offset+size])
+    offset += size
+
+def hashBuffer(buf, headerlength):
+  '''
+    Hashes a whole file already in memory (bytes or memoryview). Returns a 64 bit integer
+  '''
+  h = _newHash()
+  _hashHeaders(h, buf[:headerlength])
+  h.update(buf[headerlength:])
+  return h.intdigest()
+
+def hashFile(filename, chunksize=65536):
+  '''
+    Hashes a lrit/hrit file (filename or file-like object) reading it in chunks.
+    Returns a 64 bit integer. Raises HeaderError if the primary header is corrupted
+  '''
+  owned = not hasattr(filename, "read")
+  f = open(filename, "rb") if owned else filename
+  try:
+    h = _newHash()
+    _hashHeaders(h, readHeaderChain(f))
+    while True:
+      data = f.read(chunksize)
+      if len(data) == 0:
+        break
+      h.update(data)
+  finally:
+    if owned:
+      f.close()
+  return h.intdigest()
+
+class SeenSet(object):
+  '''
+    Set of the last "capacity" hashes, persisted to "filename" (if given) as an append only
+    list of 64 bit integers that is compacted when it grows past twice the capacity.
+  '''
+  _KEY = struct.Struct(">Q")
+
+  def __init__(self, filename=None, capacity=1000000):
+    self.filename = filename
+    self.capacity = capacity
+    self.order = deque()
+    self.keys = set()
+    self._file = None
+    self._written = 0
+    if filename is None:
+      return
+    if os.path.exists(filename):
+      with open(filename, "rb") as f:
+        data = f.read()
+      count = len(data) // self._KEY.size
+      for i in range(max(0, count - capacity), count):
+        self._remember(self._KEY.unpack_from(data, i * self._KEY.size)[0])
+      self._written = count
+    self._file = open(filename, "ab")
+
+  def __contains__(self, key):
+    return key in self.keys
+
+  def __len__(self):
+    return len(self.keys)
+
+  def _remember(self, key):
+    if key in self.keys:
+      return False
+    self.keys.add(key)
+    self.order.append(key)
+    if len(self.order) > self.capacity:
+      self.keys.discard(self.order.popleft())
+    return True
+
+  def add(self, key):
+    if not self._remember(key) or self._file is None:
+      return
+    self._file.write(self._KEY.pack(key))
+    self._written += 1
+    if self._written > 2 * self.capacity:
+      self._compact()
+
+  def _compact(self):
+    self._file.close()
+    tmp = self.filename + ".tmp"
+    with open(tmp, "wb") as f:
+      f.write(b"".join(self._KEY.pack(i) for i in self.order))
+    os.rename(tmp, self.filename)
+    self._written = len(self.order)
+    self._file = open(self.filename, "ab")
+
+  def close(self):
+    if self._file is not None:
+      self._file.close()
+      self._file = None
+
+class Deduplicator(object):
+  '''
+    Checks files against a bounded, optionally persistent, set of already seen hashes
+    and counts the duplicates. Checking does not remember a hash: call commit once the
+    file has been processed, so a failure leaves it to be retried.
+  '''
+  def __init__(self, seenfile=None, capacity=1000000):
+    self.seen = SeenSet(seenfile, capacity)
+    self.checked = 0
+    self.duplicates = 0
+
+  def checkHash(self, key):
+    '''
+      Returns True if the hash was already seen
+    '''
+    self.checked += 1
+    if key in self.seen:
+      self.duplicates += 1
+      return True
+    return False
+
+  def check(self, filename):
+    '''
+      Returns True if the file (filename or file-like object) is a duplicate
+    '''
+    return self.checkHash(hashFile(filename))
+
+  def commit(self, key):
+    '''
+      Remembers the hash of a successfully processed file
+    '''
+    self.seen.add(key)
+
+  def rate(self):
+    '''
+      Fraction of the checked files that were duplicates
+    '''
+    return float(self.duplicates) / self.checked if self.checked > 0 else 0.0
+
+  def close(self):
+    self.seen.close()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+import struct, mmap, datetime
+from xrit.packetmanager import *
+
+'''
+  Sidecar index for captures of concatenated lrit/hrit files.
+
+  Layout (big endian):
+    Header:  magic "XRITIDX1", number of entries (Q)
+    Entries: one fixed size record per embedded file, in capture order
+             offset (Q), headerlength (I), data bytes (Q), productId (H), productSubId (H),
+             time in milliseconds since 1958-01-01 (q), imageid (H), sequence (H)
+    Then two tables of entry numbers (I): sorted by (productId, productSubId, time) and by time
+
+  Missing fields are stored as NO_VALUE (ids) and -1 (time).
+'''
+
+INDEX_MAGIC = b"XRITIDX1"
+NO_VALUE = 0xFFFF
+
+_HEADER = struct.Struct(">8sQ")
+_ENTRY = struct.Struct(">QIQHHqHH")
+_POSITION = struct.Struct(">I")
+
+def toIndexTime(dt):
+  '''
+    Converts a datetime to the index time (milliseconds since baseDate)
+  '''
+  delta = dt - baseDate
+  return delta.days * 86400000 + delta.seconds * 1000 + delta.microseconds // 1000
+
+def fromIndexTime(ms):
+  '''
+    Converts an index time back to a datetime, None if the time is missing
+  '''
+  if ms < 0:
+    return None
+  return baseDate + datetime.timedelta(milliseconds=ms)
+
+def _field(head, name):
+  return head[name] if head is not None else NO_VALUE
+
+def buildCaptureIndex(capture, indexfile=None):
+  '''
+    Scans a capture of concatenated lrit/hrit files once and writes its sidecar index to
+    "indexfile" (defaults to capture + ".xidx"). Corrupted regions are skipped.
+    Returns the number of indexed files.
+  '''
+  if indexfile is None:
+    indexfile = capture + ".xidx"
+
+  entries = []
+  f = open(capture, "rb")
+  for offset, headers, data, errors in iterStream(f):
+    if len(headers) == 0 or headers[0]["type"] != 0:
+      continue
+    h = HeaderInfo(headers)
+    timestamp = h.records.get(5)
+    ms = timestamp["days"] * 86400000 + timestamp["ms"] if timestamp is not None else -1
+    entries.append((offset, headers[0]["headerlength"], len(data), _field(h.records.get(129), "productId"), _field(h.records.get(129), "productSubId"), ms, _field(h.records.get(128), "imageid"), _field(h.records.get(128), "sequence")))
+  f.close()
+
+  byProduct = sorted(range(len(entries)), key=lambda i: (entries[i][3], entries[i][4], entries[i][5], i))
+  byTime = sorted(range(len(entries)), key=lambda i: (entries[i][5], i))
+
+  o = open(indexfile, "wb")
+  o.write(_HEADER.pack(INDEX_MAGIC, len(entries)))
+  for e in entries:
+    o.write(_ENTRY.pack(*e))
+  for table in (byProduct, byTime):
+    o.write(b"".join(_POSITION.pack(i) for i in table))
+  o.close()
+  return len(entries)
+
+class CaptureIndex(object):
+  '''
+    Memory mapped reader of a capture sidecar index. Lookups by product or time are binary
+    searches over the mapped tables, and the files are read from the capture with a single seek.
+  '''
+  def __init__(self, capture, indexfile=None):
+    self.capture = capture
+    self.indexfile = indexfile or capture + ".xidx"
+    self._capture = None
+    self._f = open(self.indexfile, "rb")
+    self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, self.count = _HEADER.unpack_from(self._mm, 0)
+    if magic != INDEX_MAGIC:
+      self.close()
+      raise ValueError("%s is not a capture index" %self.indexfile)
+    self._entries = _HEADER.size
+    self._byProduct = self._entries + self.count * _ENTRY.size
+    self._byTime = self._byProduct + self.count * _POSITION.size
+
+  def __len__(self):
+    return self.count
+
+  def _raw(self, n):
+    return _ENTRY.unpack_from(self._mm, self._entries + n * _ENTRY.size)
+
+  def entry(self, n):
+    '''
+      Returns the entry number "n" (capture order) as a dict
+    '''
+    offset, headerlength, datalength, productId, productSubId, ms, imageid, sequence = self._raw(n)
+    return {
+      "entry": n,
+      "offset": offset,
+      "headerlength": headerlength,
+      "datalength": datalength,
+      "productId": productId,
+      "productSubId": productSubId,
+      "time": ms,
+      "datetime": fromIndexTime(ms),
+      "imageid": imageid,
+      "sequence": sequence
+    }
+
+  def _position(self, table, i):
+    return _POSITION.unpack_from(self._mm, table + i * _POSITION.size)[0]
+
+  def _lowerBound(self, table, key, target):
+    lo = 0
+    hi = self.count
+    while lo < hi:
+      mid = (lo + hi) // 2
+      if key(self._raw(self._position(table, mid))) < target:
+        lo = mid + 1
+      else:
+        hi = mid
+    return lo
+
+  def _range(self, table, key, start, end):
+    lo = self._lowerBound(table, key, start)
+    hi = self._lowerBound(table, key, end)
+    return [self.entry(self._position(table, i)) for i in range(lo, hi)]
+
+  def findProduct(self, productId, productSubId=None, start=None, end=None):
+    '''
+      Returns the entries of a product (and subproduct) ordered by time, optionally only the
+      ones with start <= datetime < end
+    '''
+    t0 = toIndexTime(start) if start is not None else -1
+    t1 = toIndexTime(end) if end is not None else 1 << 62
+    if productSubId is not None:
+      key = lambda e: (e[3], e[4], e[5])
+      return self._range(self._byProduct, key, (productId, productSubId, t0), (productId, productSubId, t1))
+    entries = self._range(self._byProduct, lambda e: e[3], productId, productId + 1)
+    entries = [e for e in entries if t0 <= e["time"] < t1]
+    entries.sort(key=lambda e: (e["time"], e["entry"]))
+    return entries
+
+  def findTime(self, start, end):
+    '''
+      Returns the entries with start <= datetime < end ordered by time
+    '''
+    return self._range(self._byTime, lambda e: e[5], toIndexTime(start), toIndexTime(end))
+
+  def readFile(self, entry):
+    '''
+      Reads an indexed file from the capture and returns a tuple (headers, data)
+    '''
+    if self._capture is None:
+      self._capture = open(self.capture, "rb")
+    self._capture.seek(entry["offset"])
+    hdata = self._capture.read(entry["headerlength"])
+    data = self._capture.read(entry["datalength"])
+    return getHeaderData(hdata), data
+
+  def close(self):
+    self._mm.close()
+    self._f.close()
+    if self._capture is not None:
+      self._capture.close()
+      self._capture = None
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+import re
+from collections import OrderedDict
+import numpy as np
+
+'''
+  Normalized Geostationary Projection constants (CGMS LRIT/HRIT Global Specification, 4.4)
+'''
+SAT_HEIGHT = 42164.0      # Distance from the earth centre to the satellite (km)
+EARTH_EQUATOR = 6378.169  # Equatorial radius (km)
+EARTH_POLE = 6356.5838    # Polar radius (km)
+
+_POLE_RATIO = (EARTH_POLE / EARTH_EQUATOR) ** 2   # 0.993243
+_EQUATOR_RATIO = 1.0 / _POLE_RATIO                 # 1.006803
+_ECCENTRICITY2 = 1.0 - _POLE_RATIO                 # 0.00675701
+_DISK = SAT_HEIGHT ** 2 - EARTH_EQUATOR ** 2       # 1737121856
+
+'''
+  Number of latitude / longitude grids kept by getLatLonGrid
+'''
+GRID_CACHE_SIZE = 16
+
+_gridCache = OrderedDict()
+
+def _signed(value):
+  return value - 0x100000000 if value >= 0x80000000 else value
+
+def getNavigation(headers):
+  '''
+    Builds the navigation parameters of a segment from its Image Navigation Record (type 2),
+    Image Structure (type 1) and Segment Identification (type 128) headers.
+    Returns None if there is no navigation record.
+    Raises ValueError if the projection is not the normalized geostationary projection.
+  '''
+  nav = None
+  startcol = 0
+  startline = 0
+  columns = 0
+  lines = 0
+  for head in headers:
+    if head["type"] == 1:
+      columns = head["columns"]
+      lines = head["lines"]
+    elif head["type"] == 2:
+      nav = head
+    elif head["type"] == 128:
+      startcol = head["startcol"]
+      startline = head["startline"]
+
+  if nav is None:
+    return None
+
+  projname = nav["projname"]
+  if not isinstance(projname, str):
+    projname = projname.decode("latin-1")
+  projname = projname.rstrip("\x00").strip()
+  m = re.match(r"GEOS\(([-+]?[0-9.]+)\)", projname)
+  if not m:
+    raise ValueError("Unsupported projection %s" %projname)
+
+  return {
+    "projname": projname,
+    "sublon": float(m.group(1)),
+    "cfac": _signed(nav["cfac"]),
+    "lfac": _signed(nav["lfac"]),
+    "coff": _signed(nav["coff"]),
+    "loff": _signed(nav["loff"]),
+    "startcol": startcol,
+    "startline": startline,
+    "columns": columns,
+    "lines": lines
+  }
+
+def pixelToLatLon(columns, lines, nav):
+  '''
+    Converts column / line numbers (scalars or numpy arrays, broadcasted together) to
+    latitude / longitude in degrees. Pixels outside the earth disk are NaN.
+  '''
+  x = np.radians((np.asarray(columns, dtype=np.float64) - nav["coff"]) * 65536.0 / nav["cfac"])
+  y = np.radians((np.asarray(lines, dtype=np.float64) - nav["loff"]) * 65536.0 / nav["lfac"])
+
+  cosx = np.cos(x)
+  cosy = np.cos(y)
+  siny = np.sin(y)
+  a = cosy * cosy + _EQUATOR_RATIO * siny * siny
+  b = SAT_HEIGHT * cosx * cosy
+  with np.errstate(invalid="ignore"):
+    sd = np.sqrt(b * b - a * _DISK)
+  sn = (b - sd) / a
+  s1 = SAT_HEIGHT - sn * cosx * cosy
+  s2 = sn * np.sin(x) * cosy
+  s3 = -sn * siny
+
+  lat = np.degrees(np.arctan(_EQUATOR_RATIO * s3 / np.hypot(s1, s2)))
+  lon = np.degrees(np.arctan(s2 / s1)) + nav["sublon"]
+  lon = (lon + 180.0) % 360.0 - 180.0
+  return lat, lon
+
+def latLonToPixel(lat, lon, nav):
+  '''
+    Converts latitude / longitude in degrees (scalars or numpy arrays) to fractional
+    column / line numbers. Points not visible from the satellite are NaN.
+  '''
+  clat = np.arctan(_POLE_RATIO * np.tan(np.radians(np.asarray(lat, dtype=np.float64))))
+  dlon = np.radians(np.asarray(lon, dtype=np.float64) - nav["sublon"])
+
+  cosclat = np.cos(clat)
+  rl = EARTH_POLE / np.sqrt(1.0 - _ECCENTRICITY2 * cosclat * cosclat)
+  r1 = SAT_HEIGHT - rl * cosclat * np.cos(dlon)
+  r2 = -rl * cosclat * np.sin(dlon)
+  r3 = rl * np.sin(clat)
+  rn = np.sqrt(r1 * r1 + r2 * r2 + r3 * r3)
+
+  x = np.degrees(np.arctan(-r2 / r1))
+  y = np.degrees(np.arcsin(-r3 / rn))
+  column = nav["coff"] + x * nav["cfac"] / 65536.0
+  line = nav["loff"] + y * nav["lfac"] / 65536.0
+
+  # The point faces the satellite if the satellite is above its local horizon
+  hidden = SAT_HEIGHT * (SAT_HEIGHT - r1) - rl * rl <= 0
+  column = np.where(hidden, np.nan, column)
+  line = np.where(hidden, np.nan, line)
+  return column, line
+
+def getLatLonGrid(headers):
+  '''
+    Returns (lat, lon) float32 arrays with shape (lines, columns) for every pixel of a segment,
+    or None if the segment has no navigation record. Grids are cached by navigation and
+    segment placement, so repeated segments of the same product share the same read-only arrays.
+  '''
+  nav = getNavigation(headers)
+  if nav is None:
+    return None
+
+  key = (nav["projname"], nav["cfac"], nav["lfac"], nav["coff"], nav["loff"], nav["startcol"], nav["startline"], nav["columns"], nav["lines"])
+  grid = _gridCache.pop(key, None)
+  if grid is None:
+    columns = nav["startcol"] + np.arange(nav["columns"])
+    lines = nav["startline"] + np.arange(nav["lines"])[:, np.newaxis]
+    lat, lon = pixelToLatLon(columns, lines, nav)
+    lat = lat.astype(np.float32)
+    lon = lon.astype(np.float32)
+    lat.flags.writeable = False
+    lon.flags.writeable = False
+    grid = (lat, lon)
+    while len(_gridCache) >= GRID_CACHE_SIZE:
+      _gridCache.popitem(last=False)
+  _gridCache[key] = grid
+  return grid
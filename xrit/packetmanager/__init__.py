@@ -1,5 +1,6 @@
 #!/usr/bin/env python
-import os, struct, datetime
+import os, struct, datetime, re, io, zipfile, zlib
+from multiprocessing.pool import ThreadPool
 from PIL import Image
 import binascii
 
@@ -187,78 +188,167 @@ COMPRESSION_TYPE_NAME = {
   10: "ZIP"
 }
 
+'''
+  File Type Codes and NOAA Product IDs that carry text products
+'''
+TEXT_FILE_TYPE_CODES = (1, 2, 214)
+TEXT_PRODUCT_IDS = (1, 9, 42)
+
+'''
+  Default target path template for organizeFiles
+'''
+DEFAULT_ORGANIZE_TEMPLATE = "{product}/{subproduct}/{date:%Y-%m-%d}/{filename}"
+
 '''
   Base date for calcuting timestamps
 '''
 baseDate = datetime.datetime(1958, 1, 1)
 
+'''
+  Plausibility limits used when reading headers and scanning streams of concatenated files
+'''
+MAX_HEADER_LENGTH = 0xFFFF
+MAX_STREAM_DATA_LENGTH = 64 * 1024 * 1024
+
+class HeaderError(Exception):
+  '''
+    A corrupted header record. "offset" is the record position relative to the start
+    of the file and "type" is the record type, when they are known.
+  '''
+  def __init__(self, reason, offset=None, type=None):
+    Exception.__init__(self, reason)
+    self.reason = reason
+    self.offset = offset
+    self.type = type
+
+  def __str__(self):
+    where = []
+    if self.type is not None:
+      where.append("record type %s" % self.type)
+    if self.offset is not None:
+      where.append("offset %s" % self.offset)
+    if len(where) == 0:
+      return self.reason
+    return "%s: %s" % (" at ".join(where), self.reason)
+
 def binary(num, length=8):
   return format(num, '#0{}b'.format(length + 2))
 
+def _openSource(source):
+  '''
+    Returns a tuple (file, name, owned) for a filename or an already open file-like object,
+    like the members returned by xrit.archive. Only owned files must be closed.
+  '''
+  if hasattr(source, "read"):
+    return source, getattr(source, "name", "<stream>"), False
+  return open(source, "rb"), source, True
+
+def readHeaderChain(f):
+  '''
+    Reads the header chain from file without seeking and returns its bytes, leaving the file
+    at the start of the data section, so it works on non seekable streams.
+    Raises HeaderError if the primary header is corrupted
+  '''
+  primary = f.read(16)
+  headerlength = readPrimaryHeader(io.BytesIO(primary))[2]
+  return primary + f.read(headerlength - 16)
+
 def parseFile(filename, showStructuredHeader=False, showImageDataRecord=False):
   '''
-    Parses a lrit/hrit file and prints the human readable headers
+    Parses a lrit/hrit file (filename or file-like object) and prints the human readable headers
   '''
-  f = open(filename, "rb")
+  f, name, owned = _openSource(filename)
 
   try:
-    k = readHeader(f)
-    type, filetypecode, headerlength, datalength = k
-  except:
-    print("   Header 0 is corrupted for file %s" %filename)
+    data = readHeaderChain(f)
+  except HeaderError as e:
+    print("   Header 0 is corrupted for file %s: %s" %(name, e))
+    if owned:
+      f.close()
     return
-  f.seek(0, 0)
-  data = f.read(headerlength)
   headers = getHeaderData(data)
   printHeaders(headers, showStructuredHeader, showImageDataRecord)
-  f.close()
+  if owned:
+    f.close()
+
+def parseStream(filename, showStructuredHeader=False, showImageDataRecord=False):
+  '''
+    Parses a stream of concatenated lrit/hrit files and prints the human readable headers
+    of each one, skipping over corrupted regions
+  '''
+  f, name, owned = _openSource(filename)
+  for offset, headers, data, errors in iterStream(f):
+    print("File at offset %s" %offset)
+    for e in errors:
+      print("   Corrupted: %s" %e)
+    if len(headers) > 0:
+      printHeaders(headers, showStructuredHeader, showImageDataRecord)
+  if owned:
+    f.close()
 
 def dumpData(filename, output):
   '''
-    Reads lrit/hrit file "filename" and writes the data section to file "output"
+    Reads lrit/hrit file "filename" (or file-like object) and writes the data section to file "output"
   '''
-  f = open(filename, "rb")
+  f, name, owned = _openSource(filename)
 
   try:
-    k = readHeader(f)
-    type, filetypecode, headerlength, datalength = k
-  except:
-    print("   Header 0 is corrupted for file %s" %filename)
+    hdata = readHeaderChain(f)
+  except HeaderError as e:
+    print("   Header 0 is corrupted for file %s: %s" %(name, e))
+    if owned:
+      f.close()
     return
-  f.seek(0, 2)
-  length = f.tell() - headerlength
-  f.seek(headerlength, 0)
+  length = (struct.unpack(">Q", hdata[8:16])[0] + 7) // 8
   o = open(output, "wb")
   c = 0
 
-  while c < length:
+  while True:
     data = f.read(4096)
     if len(data) == 0:
-      print("   Error: Premature file end. Expected %s bytes and only read %s bytes" %(length, c))
       break
     o.write(data)
     c += len(data)
 
-  f.close()
+  if c < length:
+    print("   Error: Premature file end. Expected %s bytes and only read %s bytes" %(length, c))
+
+  if owned:
+    f.close()
   o.close()
 
 def loadData(filename):
   '''
-    Reads an lrit/hrit file and returns the data section content
+    Reads an lrit/hrit file (filename or file-like object) and returns the data section content
   '''
-  f = open(filename, "rb")
+  f, name, owned = _openSource(filename)
 
   try:
-    k = readHeader(f)
-    type, filetypecode, headerlength, datalength = k
-  except:
-    print("   Header 0 is corrupted for file %s" %filename)
+    readHeaderChain(f)
+  except HeaderError as e:
+    print("   Header 0 is corrupted for file %s: %s" %(name, e))
+    if owned:
+      f.close()
     return
-  f.seek(headerlength, 0)
   data = f.read()
-  f.close()
+  if owned:
+    f.close()
   return data
 
+def loadFile(filename):
+  '''
+    Reads an lrit/hrit file (filename or file-like object) and returns a tuple (headers, data)
+    Raises HeaderError if the header chain is corrupted
+  '''
+  f, name, owned = _openSource(filename)
+  try:
+    headers, errors = decodeHeaders(readHeaderChain(f), True)
+    data = f.read()
+  finally:
+    if owned:
+      f.close()
+  return headers, data
+
 def manageFile(filename):
   '''
     Reads a lrit/hrit file and renames itself to the filename specified in the header
@@ -266,18 +356,21 @@ def manageFile(filename):
   f = open(filename, "rb")
 
   try:
-    k = readHeader(f)
-    type, filetypecode, headerlength, datalength = k
-  except:
-    print("   Header 0 is corrupted for file %s" %filename)
+    type, filetypecode, headerlength, datalength = readPrimaryHeader(f)
+  except HeaderError as e:
+    print("   Header 0 is corrupted for file %s: %s" %(filename, e))
+    f.close()
     return
 
   newfilename = filename
-  while f.tell() < headerlength:
-    data = readHeader(f)
-    if data[0] == 4:
-      newfilename = data[1]
-      break
+  try:
+    while f.tell() < headerlength:
+      data = readHeader(f)
+      if data[0] == 4:
+        newfilename = data[1]
+        break
+  except HeaderError as e:
+    print("   Header chain is corrupted for file %s: %s" %(filename, e))
   f.close()
   if filename != newfilename:
     print("   Renaming %s to %s/%s" %(filename, os.path.dirname(filename), newfilename))
@@ -285,24 +378,192 @@ def manageFile(filename):
   else:
     print("   Couldn't find name in %s" %filename)
 
+def _safeName(name):
+  return re.sub(r"[^A-Za-z0-9 ._()-]", "_", name).strip()
+
+def readFileInfo(filename):
+  '''
+    Reads only the header chain of a lrit/hrit file and returns a dict with the fields
+    available to organizeFiles templates, or None if the header is corrupted
+  '''
+  try:
+    with open(filename, "rb") as f:
+      headers, errors = decodeHeaders(readHeaderChain(f))
+  except (IOError, HeaderError):
+    return None
+
+  h = HeaderInfo(headers)
+  name = _safeName(os.path.basename(h.filename or ""))
+  if len(name) == 0:
+    name = os.path.basename(filename)
+  base, ext = os.path.splitext(name)
+  return {
+    "source": filename,
+    "filename": name,
+    "name": base,
+    "ext": ext,
+    "product": _safeName(h.product or "Unknown"),
+    "subproduct": _safeName(h.subproduct or "Unknown"),
+    "productid": h.productId,
+    "subid": h.productSubId,
+    "date": h.timestamp,
+    "imageid": h.imageid,
+    "sequence": h.sequence
+  }
+
+def _freeTarget(target, claimed):
+  base, ext = os.path.splitext(target)
+  n = 1
+  while target in claimed or os.path.lexists(target):
+    target = "%s_%s%s" %(base, n, ext)
+    n += 1
+  return target
+
+def planOrganize(filenames, outdir, template=DEFAULT_ORGANIZE_TEMPLATE, workers=8):
+  '''
+    Reads the headers of "filenames" concurrently and computes their target paths under "outdir"
+    from "template", a str.format pattern over the readFileInfo fields.
+    Returns a tuple (plan, skipped) where plan is a list of (source, target) and skipped a
+    list of (source, reason). Colliding targets get a numeric suffix.
+  '''
+  pool = ThreadPool(workers)
+  try:
+    infos = pool.map(readFileInfo, filenames)
+  finally:
+    pool.close()
+
+  plan = []
+  skipped = []
+  claimed = set()
+  for filename, info in zip(filenames, infos):
+    if info is None:
+      skipped.append((filename, "corrupted header"))
+      continue
+    try:
+      target = os.path.join(outdir, template.format(**info))
+    except (KeyError, IndexError, ValueError, TypeError, AttributeError) as e:
+      skipped.append((filename, "cannot build target path: %r" %e))
+      continue
+    target = os.path.normpath(target)
+    if os.path.exists(target) and os.path.samefile(filename, target):
+      skipped.append((filename, "already in place"))
+      continue
+    target = _freeTarget(target, claimed)
+    claimed.add(target)
+    plan.append((filename, target))
+  return plan, skipped
+
+def applyPlan(plan, link=False):
+  '''
+    Renames (or hardlinks if "link" is True) every (source, target) of a plan in one pass.
+    Returns a list of (source, reason) for the operations that failed.
+  '''
+  failed = []
+  dirs = set()
+  for source, target in plan:
+    try:
+      folder = os.path.dirname(target)
+      if folder and folder not in dirs:
+        if not os.path.isdir(folder):
+          os.makedirs(folder)
+        dirs.add(folder)
+      if link:
+        os.link(source, target)
+      else:
+        os.rename(source, target)
+    except OSError as e:
+      failed.append((source, str(e)))
+  return failed
+
+def organizeFiles(directory, outdir=None, template=DEFAULT_ORGANIZE_TEMPLATE, link=False, dryrun=False, workers=8):
+  '''
+    Organizes every lrit/hrit file in "directory" under "outdir" (defaults to "directory")
+    using the header fields in "template". With "dryrun" only the plan is printed.
+  '''
+  if outdir is None:
+    outdir = directory
+  filenames = sorted(os.path.join(directory, i) for i in os.listdir(directory))
+  filenames = [i for i in filenames if os.path.isfile(i)]
+  plan, skipped = planOrganize(filenames, outdir, template, workers)
+  for source, reason in skipped:
+    print("   Skipping %s: %s" %(source, reason))
+  if dryrun:
+    for source, target in plan:
+      print("   %s -> %s" %(source, target))
+    failed = []
+  else:
+    failed = applyPlan(plan, link)
+    for source, reason in failed:
+      print("   Failed %s: %s" %(source, reason))
+  print("%s files planned, %s skipped, %s failed" %(len(plan), len(skipped), len(failed)))
+  return plan, skipped, failed
+
 def getHeaderData(data):
   '''
     Interprets the buffer "data" as a lrit/hrit header chain
   '''
+  headers, errors = decodeHeaders(data)
+  for e in errors:
+    print("Cannot parse header: %s" %e)
+  return headers
+
+def decodeHeaders(data, strict=False):
+  '''
+    Validates and interprets the buffer "data" as a lrit/hrit header chain.
+    Every record is bounds-checked against the buffer and the primary header "headerlength".
+    Returns a tuple (headers, errors) where errors is a list of HeaderError for the records
+    that could not be decoded. If "strict" is True the first error is raised instead.
+  '''
   headers = []
-  while len(data) > 0:
-    type = data[0] if isinstance(data[0], int) else ord(data[0])
-    size = struct.unpack(">H", data[1:3])[0]
-    o = data[3:size]
-    data = data[size:]
+  errors = []
+  limit = len(data)
+  offset = 0
+  while offset < limit:
+    if limit - offset < 3:
+      e = HeaderError("truncated record (%s bytes left)" %(limit - offset), offset)
+      if strict:
+        raise e
+      errors.append(e)
+      break
+
+    type = data[offset] if isinstance(data[offset], int) else ord(data[offset])
+    size = struct.unpack(">H", data[offset+1:offset+3])[0]
+    if size < 3 or offset + size > limit:
+      # The size field is broken so there is no way to find the next record
+      e = HeaderError("invalid record size %s (%s bytes left)" %(size, limit - offset), offset, type)
+      if strict:
+        raise e
+      errors.append(e)
+      break
+
     try:
-      td = parseHeader(type, o)
-      headers.append(td)
-    except Exception, e:
-      print("Cannot parse header %s: %s" %(type, e))
-    if td["type"] == 0:
-      data = data[:td["headerlength"]-size]
-  return headers
+      td = parseHeader(type, data[offset+3:offset+size])
+    except Exception as e:
+      err = HeaderError("cannot parse record: %s" %e, offset, type)
+      if strict:
+        raise err
+      errors.append(err)
+      offset += size
+      continue
+
+    if offset == 0:
+      err = None
+      if type != 0:
+        err = HeaderError("first record is not a primary header", offset, type)
+      elif td["headerlength"] < size:
+        err = HeaderError("header length %s is smaller than the primary header" %td["headerlength"], offset, type)
+      elif td["headerlength"] > len(data):
+        err = HeaderError("header length %s exceeds available %s bytes" %(td["headerlength"], len(data)), offset, type)
+      else:
+        limit = td["headerlength"]
+      if err is not None:
+        if strict:
+          raise err
+        errors.append(err)
+
+    headers.append(td)
+    offset += size
+  return headers, errors
 
 def parseHeader(type, data):
   '''
@@ -336,10 +597,10 @@ def parseHeader(type, data):
     return {"type":type, "data":data}
 
   elif type == 9:
-    parts = data.split("\x00")
+    parts = data.split(b"\x00")
     name = None
     for i in parts:
-      if len(i) > 0 and i[0] == "\x1F":
+      if i[:1] == b"\x1F":
         name = i[1:]
         break
     return {"type":type, "data":data, "name": name}
@@ -364,16 +625,46 @@ def parseHeader(type, data):
   else:
     return {"type":type}
 
+def readPrimaryHeader(f):
+  '''
+    Reads the primary header from file and returns a tuple (type, filetypecode, headerlength, datalength)
+    Raises HeaderError if the first record is not a valid primary header
+  '''
+  k = readHeader(f)
+  if k[0] != 0:
+    raise HeaderError("first record is not a primary header", 0, k[0])
+  if k[2] < 16:
+    raise HeaderError("header length %s is smaller than the primary header" %k[2], 0, 0)
+  if k[2] > MAX_HEADER_LENGTH:
+    raise HeaderError("implausible header length %s" %k[2], 0, 0)
+  return k
+
 def readHeader(f):
   '''
     Reads a reader from file and returns a tuple with its values
+    Raises HeaderError if the record is truncated or cannot be decoded
   '''
-  global t
-  type = ord(f.read(1))
-  size = f.read(2)
-  size = struct.unpack(">H", size)[0]
+  try:
+    offset = f.tell()
+  except Exception:
+    offset = None
+  head = f.read(3)
+  if len(head) < 3:
+    raise HeaderError("truncated record (%s bytes left)" %len(head), offset)
+  type = head[0] if isinstance(head[0], int) else ord(head[0])
+  size = struct.unpack(">H", head[1:3])[0]
+  if size < 3:
+    raise HeaderError("invalid record size %s" %size, offset, type)
   data = f.read(size-3)
+  if len(data) < size-3:
+    raise HeaderError("truncated record (expected %s bytes, got %s)" %(size-3, len(data)), offset, type)
 
+  try:
+    return _unpackHeader(type, data)
+  except struct.error as e:
+    raise HeaderError("cannot parse record: %s" %e, offset, type)
+
+def _unpackHeader(type, data):
   if type == 0:
     filetypecode, headerlength, datalength = struct.unpack(">BIQ", data)
     return type, filetypecode, headerlength, datalength
@@ -402,10 +693,10 @@ def readHeader(f):
     return type, data
 
   elif type == 9:
-    parts = data.split("\x00")
+    parts = data.split(b"\x00")
     name = None
     for i in parts:
-      if len(i) > 0 and i[0] == "\x1F":
+      if i[:1] == b"\x1F":
         name = i[1:]
         break
     return type, name, data
@@ -429,7 +720,340 @@ def readHeader(f):
     return type, data
 
   else:
-    return type
+    return type, data
+
+class _StreamBuffer(object):
+  '''
+    Read-ahead buffer over a file object used by iterStream. Positions and slices are relative
+    to the current stream offset, consumed bytes are dropped from the front of the buffer.
+  '''
+  def __init__(self, f, chunksize):
+    self.f = f
+    self.chunksize = chunksize
+    self.data = bytearray()
+    self.start = 0
+    self.offset = 0
+    self.eof = False
+
+  def __len__(self):
+    return len(self.data) - self.start
+
+  def __getitem__(self, s):
+    begin, end, step = s.indices(len(self))
+    return bytes(self.data[self.start+begin:self.start+end])
+
+  def find(self, sub, start):
+    pos = self.data.find(sub, self.start + start)
+    return pos - self.start if pos != -1 else -1
+
+  def fill(self, n):
+    '''
+      Tries to have at least "n" bytes buffered. Returns False if the stream ended before that
+    '''
+    while len(self) < n and not self.eof:
+      chunk = self.f.read(max(self.chunksize, n - len(self)))
+      if len(chunk) == 0:
+        self.eof = True
+      else:
+        self.data += chunk
+    return len(self) >= n
+
+  def consume(self, n):
+    self.start += n
+    self.offset += n
+    # Compact once the consumed part outweighs what is left, so the cost stays linear
+    if self.start >= self.chunksize and 2 * self.start >= len(self.data):
+      del self.data[:self.start]
+      self.start = 0
+
+def _isPrimaryHeader(buf, pos=0):
+  '''
+    Checks if the 16 bytes at "pos" look like a primary header record
+  '''
+  if len(buf) - pos < 16 or buf[pos:pos+3] != b"\x00\x00\x10":
+    return False
+  headerlength = struct.unpack(">I", buf[pos+4:pos+8])[0]
+  return 16 <= headerlength <= MAX_HEADER_LENGTH
+
+def _isHeaderChain(buf, pos, headerlength):
+  '''
+    Checks if the record sizes starting at "pos" add up exactly to "headerlength"
+  '''
+  offset = 0
+  while offset < headerlength:
+    if headerlength - offset < 3:
+      return False
+    size = struct.unpack(">H", buf[pos+offset+1:pos+offset+3])[0]
+    if size < 3:
+      return False
+    offset += size
+  return offset == headerlength
+
+def _findPrimaryHeader(sb, start, limit):
+  '''
+    Searches the stream buffer for the next plausible primary header starting between "start"
+    and "limit", that is, one that is followed by a well formed header chain.
+    Returns its position in the buffer or -1 if there is none.
+  '''
+  while True:
+    pos = sb.find(b"\x00\x00\x10", start)
+    if pos == -1 or pos >= limit:
+      if pos != -1 or sb.eof or len(sb) >= limit + 2:
+        return -1
+      start = max(start, len(sb) - 2)
+      sb.fill(len(sb) + 1)
+      continue
+    sb.fill(pos + 16)
+    if _isPrimaryHeader(sb, pos):
+      headerlength = struct.unpack(">I", sb[pos+4:pos+8])[0]
+      if sb.fill(pos + headerlength) and _isHeaderChain(sb, pos, headerlength):
+        return pos
+    start = pos + 1
+
+def _skipToPrimaryHeader(sb, start):
+  '''
+    Consumes the stream buffer up to the next plausible primary header searching from "start",
+    or up to the end of the stream. The scanned bytes are dropped as the search goes on so
+    corrupted regions are skipped in constant memory. Returns the number of skipped bytes.
+  '''
+  skipped = 0
+  while True:
+    limit = len(sb)
+    pos = _findPrimaryHeader(sb, start, limit)
+    if pos != -1:
+      sb.consume(pos)
+      return skipped + pos
+    sb.consume(limit)
+    skipped += limit
+    start = 0
+    if not sb.fill(1):
+      return skipped
+
+def iterStream(f, resync=True, chunksize=65536):
+  '''
+    Iterates over a stream of concatenated lrit/hrit files, yielding a tuple
+    (offset, headers, data, errors) for each file found. Corrupted regions are reported as
+    entries with no headers. If "resync" is True the reader skips to the next plausible
+    primary header after a corruption, otherwise it stops at the first unreadable file.
+  '''
+  sb = _StreamBuffer(f, chunksize)
+  while sb.fill(1):
+    offset = sb.offset
+    sb.fill(16)
+    if not _isPrimaryHeader(sb):
+      if not resync:
+        yield offset, [], b"", [HeaderError("no primary header found", offset)]
+        return
+      skipped = _skipToPrimaryHeader(sb, 1)
+      yield offset, [], b"", [HeaderError("no primary header found, skipped %s bytes" %skipped, offset)]
+      continue
+
+    headerlength = struct.unpack(">I", sb[4:8])[0]
+    datasize = (struct.unpack(">Q", sb[8:16])[0] + 7) // 8
+    if not sb.fill(headerlength):
+      error = "truncated header chain (expected %s bytes, got %s)" %(headerlength, len(sb))
+      if not resync:
+        yield offset, [], b"", [HeaderError(error, offset)]
+        return
+      skipped = _skipToPrimaryHeader(sb, 1)
+      yield offset, [], b"", [HeaderError("%s, skipped %s bytes" %(error, skipped), offset)]
+      continue
+
+    headers, errors = decodeHeaders(sb[:headerlength])
+    if resync and not _isHeaderChain(sb, 0, headerlength):
+      # Broken record sizes, the primary header is not trustworthy either
+      skipped = _skipToPrimaryHeader(sb, 1)
+      errors.append(HeaderError("corrupted header chain, skipped %s bytes" %skipped, offset))
+      yield offset, [], b"", errors
+      continue
+
+    end = headerlength + datasize
+    cut = -1
+    if resync and datasize > MAX_STREAM_DATA_LENGTH:
+      errors.append(HeaderError("implausible data length %s" %datasize, 0, 0))
+      end = _findPrimaryHeader(sb, headerlength, headerlength + MAX_STREAM_DATA_LENGTH)
+      if end == -1:
+        end = min(len(sb), headerlength + MAX_STREAM_DATA_LENGTH)
+    elif not sb.fill(end):
+      # The stream ended early, the next file may still start inside the missing part
+      cut = _findPrimaryHeader(sb, 16, len(sb)) if resync else -1
+      if cut == -1:
+        errors.append(HeaderError("truncated data (expected %s bytes, got %s)" %(datasize, len(sb) - headerlength)))
+        end = len(sb)
+    elif resync and sb.fill(end + 16) and not _isPrimaryHeader(sb, end):
+      # The length field is wrong or data was lost, the next file starts somewhere else
+      cut = _findPrimaryHeader(sb, 16, end)
+
+    if cut != -1 and cut < headerlength:
+      # The record sizes happened to add up over the start of the next file
+      errors.append(HeaderError("header chain cut short by the next file after %s bytes" %cut, offset))
+      yield offset, [], b"", errors
+      sb.consume(cut)
+      continue
+    if cut != -1:
+      errors.append(HeaderError("data section cut short by the next file (expected %s bytes, got %s)" %(datasize, cut - headerlength)))
+      end = cut
+
+    yield offset, headers, sb[headerlength:end], errors
+    sb.consume(end)
+
+def _nativeText(data):
+  if isinstance(data, bytes) and not isinstance(data, str):
+    data = data.decode("latin-1")
+  return data.rstrip("\x00")
+
+def decodeTimestamp(head):
+  '''
+    Returns the datetime of a Timestamp Record (type 5)
+  '''
+  return baseDate + datetime.timedelta(days=head["days"], milliseconds=head["ms"])
+
+def _ancillaryItems(data):
+  items = []
+  for item in _nativeText(data).split(";"):
+    item = item.strip()
+    if len(item) == 0:
+      continue
+    if "=" in item:
+      key, value = item.split("=", 1)
+      items.append((key.strip(), value.strip()))
+    else:
+      items.append((item, None))
+  return items
+
+def decodeAncillaryText(data):
+  '''
+    Decodes the "key = value;key = value" content of an Ancillary Text record (type 6)
+    into a dict. Items without "=" are kept with value None.
+  '''
+  return dict(_ancillaryItems(data))
+
+def decodeStructuredRecord(data):
+  '''
+    Splits the content of a Header Structured Record (type 130) in its "UI" delimited fields
+  '''
+  return [i.strip() for i in _nativeText(data).split("UI") if len(i.strip()) > 0]
+
+class _lazy(object):
+  '''
+    Decorator for a property that is computed on first access and then stored in the instance
+  '''
+  def __init__(self, func):
+    self.func = func
+    self.__name__ = func.__name__
+    self.__doc__ = func.__doc__
+
+  def __get__(self, obj, cls):
+    if obj is None:
+      return self
+    value = self.func(obj)
+    obj.__dict__[self.__name__] = value
+    return value
+
+class HeaderInfo(object):
+  '''
+    Typed view of a header list. Every accessor is decoded on first use and cached, so
+    reading only the product and time does not do the string work of the other records.
+  '''
+  def __init__(self, headers):
+    self.headers = headers
+    self.records = {}
+    for head in headers:
+      if head["type"] not in self.records:
+        self.records[head["type"]] = head
+
+  def _field(self, type, name):
+    head = self.records.get(type)
+    return head[name] if head is not None else None
+
+  @_lazy
+  def filetypecode(self):
+    return self._field(0, "filetypecode")
+
+  @_lazy
+  def productId(self):
+    return self._field(129, "productId")
+
+  @_lazy
+  def productSubId(self):
+    return self._field(129, "productSubId")
+
+  @_lazy
+  def product(self):
+    '''
+      Product name from NOAA_PRODUCT_ID, None if there is no NOAA Specific Header
+    '''
+    if self.productId is None:
+      return None
+    if self.productId in NOAA_PRODUCT_ID:
+      return NOAA_PRODUCT_ID[self.productId]["name"]
+    return "Unknown(%s)" %self.productId
+
+  @_lazy
+  def subproduct(self):
+    '''
+      Subproduct name from NOAA_PRODUCT_ID, None if there is no NOAA Specific Header
+    '''
+    if self.productId is None:
+      return None
+    sub = NOAA_PRODUCT_ID.get(self.productId, {"sub": {}})["sub"]
+    if self.productSubId in sub:
+      return sub[self.productSubId]
+    return "Unknown(%s)" %self.productSubId
+
+  @_lazy
+  def imageid(self):
+    return self._field(128, "imageid")
+
+  @_lazy
+  def sequence(self):
+    return self._field(128, "sequence")
+
+  @_lazy
+  def filename(self):
+    '''
+      Filename from the Annotation Record (type 4)
+    '''
+    head = self.records.get(4)
+    return _nativeText(head["filename"]).strip() if head is not None else None
+
+  @_lazy
+  def timestamp(self):
+    '''
+      datetime from the Timestamp Record (type 5)
+    '''
+    head = self.records.get(5)
+    return decodeTimestamp(head) if head is not None else None
+
+  @_lazy
+  def ancillary(self):
+    '''
+      Ancillary Text (type 6) decoded as a dict, empty if there is no such record
+    '''
+    head = self.records.get(6)
+    return decodeAncillaryText(head["data"]) if head is not None else {}
+
+  @_lazy
+  def structured(self):
+    '''
+      Header Structured Record (type 130) fields, empty if there is no such record
+    '''
+    head = self.records.get(130)
+    return decodeStructuredRecord(head["data"]) if head is not None else []
+
+def loadHeaderInfo(filename):
+  '''
+    Reads only the header chain of a lrit/hrit file (filename or file-like object) and returns
+    it as a HeaderInfo
+    Raises HeaderError if the header chain is corrupted
+  '''
+  f, name, owned = _openSource(filename)
+  try:
+    headers, errors = decodeHeaders(readHeaderChain(f), True)
+  finally:
+    if owned:
+      f.close()
+  return HeaderInfo(headers)
 
 def printHeaders(headers, showStructuredHeader=False, showImageDataRecord=False):
   '''
@@ -439,7 +1063,7 @@ def printHeaders(headers, showStructuredHeader=False, showImageDataRecord=False)
     type = head["type"]
     if type == 0:
       print("Primary Header: ")
-      if FILE_TYPE_CODE_NAME.has_key(head["filetypecode"]):
+      if head["filetypecode"] in FILE_TYPE_CODE_NAME:
         print("   File Type Code: %s" % FILE_TYPE_CODE_NAME[head["filetypecode"]])
       else:
         print("   File Type Code: Unknown(%s)" % head["filetypecode"])
@@ -450,7 +1074,7 @@ def printHeaders(headers, showStructuredHeader=False, showImageDataRecord=False)
       print("   Bits Per Pixel: %s" %head["bitsperpixel"])
       print("   Columns: %s" %head["columns"])
       print("   Lines: %s" %head["lines"])
-      if COMPRESSION_TYPE_NAME.has_key(head["compression"]):
+      if head["compression"] in COMPRESSION_TYPE_NAME:
         print("   Compression: %s" %COMPRESSION_TYPE_NAME[head["compression"]])
       else:
         print("   Compression: Unknown(%s)" %head["compression"])
@@ -476,14 +1100,17 @@ def printHeaders(headers, showStructuredHeader=False, showImageDataRecord=False)
 
     elif type == 5:
       print("Timestamp Record")
-      print("   DateTime: %s" % (baseDate + datetime.timedelta(days=head["days"], milliseconds=head["ms"])))
+      print("   DateTime: %s" % decodeTimestamp(head))
 
     elif type == 6:
       print("Ancillary Text")
       print("   Data: ")
-      t = head["data"].split(";")
-      for i in t:
-        print("     %s" %i)
+      # Items are printed in record order, repeated keys included
+      for key, value in _ancillaryItems(head["data"]):
+        if value is None:
+          print("     %s" %key)
+        else:
+          print("     %s = %s" %(key, value))
 
     elif type == 7:
       print("Key Header")
@@ -507,10 +1134,10 @@ def printHeaders(headers, showStructuredHeader=False, showImageDataRecord=False)
     elif type == 129:
       print("NOAA Specific Header")
       print("   Signature: %s" %head["signature"])
-      if NOAA_PRODUCT_ID.has_key(head["productId"]):
+      if head["productId"] in NOAA_PRODUCT_ID:
         product = NOAA_PRODUCT_ID[head["productId"]]
         print("   Product ID: %s" %product["name"])
-        if product["sub"].has_key(head["productSubId"]):
+        if head["productSubId"] in product["sub"]:
           print("   Product SubId: %s" %product["sub"][head["productSubId"]])
         else:
           print("   Product SubId: Unknown(%s)" %head["productSubId"])
@@ -518,7 +1145,7 @@ def printHeaders(headers, showStructuredHeader=False, showImageDataRecord=False)
         print("   Product ID: Unknown(%s)" %head["productId"])
         print("   Product SubId: Unknown(%s)" %head["productSubId"])
       print("   Parameter: %s" %head["parameter"])
-      if COMPRESSION_TYPE_NAME.has_key(head["compression"]):
+      if head["compression"] in COMPRESSION_TYPE_NAME:
         print("   Compression: %s" %COMPRESSION_TYPE_NAME[head["compression"]])
       else:
         print("   Compression: Unknown(%s)" %head["compression"])
@@ -526,7 +1153,7 @@ def printHeaders(headers, showStructuredHeader=False, showImageDataRecord=False)
     elif type == 130:
       print("Header Structured Record")
       if showImageDataRecord:
-        t = head["data"].split("UI")
+        t = decodeStructuredRecord(head["data"])
         print("   Data: ")
         for i in t:
           print("     %s" %i)
@@ -569,6 +1196,16 @@ def parseDCSHeader(header):
     "sourcecode": sourcecode.decode("utf-8")
   }
 
+def formatDCS(header, messages):
+  '''
+    Returns the lines of a human readable table of a parsed DCS file
+  '''
+  lines = ["Header: %s" %header]
+  lines.append(" Address       Date / Time      Status  Signal  Frequency Offset  MIN  DQN  Channel  Source  ")
+  for i in messages:
+    lines.append(" %8s  %19s    %1s     %2s dB          %2s          %1s    %1s    %4s      %2s    " % (i["address"], i["datetime"], i["status"], i["signal"], i["frequencyoffset"], i["modindexnormal"], i["dataqualnominal"], i["channel"], i["sourcecode"]))
+  return lines
+
 def parseDCS(data):
   baseHeader = data[:64]
   data = data[64:]
@@ -582,70 +1219,211 @@ def parseDCS(data):
 
   return baseHeader, d
 
-def dumpImage(filename):
-  f = open(filename, "rb")
-  try:
-    k = readHeader(f)
-    type, filetypecode, headerlength, datalength = k
-  except:
-    print("   Header 0 is corrupted for file %s" %filename)
-    f.close()
-    return
+def getCompression(headers):
+  '''
+    Returns the compression of the data section described by the header list, or -1 if unknown
+  '''
+  compression = -1
+  for i in headers:
+    if i["type"] in (1, 129) and compression < i["compression"]:
+      compression = i["compression"]
+  return compression
+
+def isTextFile(headers):
+  '''
+    Checks if the header list describes a Text, Messages or EMWIN file
+  '''
+  for i in headers:
+    if i["type"] == 0 and i["filetypecode"] in TEXT_FILE_TYPE_CODES:
+      return True
+    if i["type"] == 129 and i["productId"] in TEXT_PRODUCT_IDS:
+      return True
+  return False
 
-  if filetypecode != 0:
-    print("The file %s is not an image container." %filename)
+def splitBulletins(data):
+  '''
+    Splits a text bundle in WMO bulletins delimited by SOH (0x01) and ETX (0x03).
+    Returns an empty list if there is no SOH in the data.
+  '''
+  bulletins = []
+  start = data.find(b"\x01")
+  while start != -1:
+    end = data.find(b"\x03", start)
+    end = len(data) if end == -1 else end + 1
+    bulletins.append(data[start:end])
+    start = data.find(b"\x01", end)
+  return bulletins
+
+_WMO_HEADING = re.compile(b"([A-Z]{4}[0-9]{2}) ([A-Z]{4}) ([0-9]{6})( [A-Z]{3})?")
+_AWIPS_ID = re.compile(b"([A-Z0-9]{4,6})$")
+
+def getBulletinName(bulletin):
+  '''
+    Builds a filename from the WMO abbreviated heading and AWIPS ID of a bulletin.
+    Returns None if the bulletin has no heading.
+  '''
+  lines = [i.strip() for i in bulletin.replace(b"\r", b"").split(b"\n")]
+  lines = [i for i in lines if len(i) > 0]
+  for n in range(min(len(lines), 3)):
+    m = _WMO_HEADING.match(lines[n])
+    if m:
+      parts = [i.strip() for i in m.groups() if i]
+      if n + 1 < len(lines) and _AWIPS_ID.match(lines[n + 1]):
+        parts.append(lines[n + 1])
+      return b"_".join(parts).decode("ascii") + ".TXT"
+  return None
+
+def _nativeName(name):
+  return os.path.basename(_nativeText(name).strip())
+
+def getTextProducts(headers, data):
+  '''
+    Returns the text products of a data section as a list of (name, content).
+    ZIP payloads are decompressed in memory and bundles are split in individual bulletins.
+  '''
+  name = None
+  for i in headers:
+    if i["type"] == 4:
+      name = _nativeName(i["filename"])
+  name = os.path.splitext(name)[0] if name else "text"
+
+  if getCompression(headers) == 10:
+    z = zipfile.ZipFile(io.BytesIO(data))
+    members = [(_nativeName(i.filename), z.read(i)) for i in z.infolist() if not i.filename.endswith("/")]
+    z.close()
+  else:
+    members = [(name + ".TXT", data)]
+
+  products = []
+  for mname, content in members:
+    bulletins = splitBulletins(content)
+    if len(bulletins) <= 1:
+      products.append((mname, content))
+      continue
+    base = os.path.splitext(mname)[0]
+    for n in range(len(bulletins)):
+      bname = getBulletinName(bulletins[n]) or "%s_%s.TXT" %(base, n)
+      products.append((bname, bulletins[n]))
+  return products
+
+def _writeProducts(outdir, products):
+  # Products often share a name, suffix them instead of overwriting earlier ones
+  claimed = set()
+  for name, content in products:
+    target = _freeTarget(os.path.join(outdir, name), claimed)
+    claimed.add(target)
+    f = open(target, "wb")
+    f.write(content)
     f.close()
+  return len(products)
+
+def extractTextProducts(filenames, outdir, batchsize=512):
+  '''
+    Extracts the text products of many lrit/hrit files to "outdir" in a single process.
+    Files that are not Text, Messages or EMWIN are ignored. Products are buffered in memory
+    and written "batchsize" at a time. Returns the number of products written.
+  '''
+  batch = []
+  count = 0
+  try:
+    for filename in filenames:
+      try:
+        headers, data = loadFile(filename)
+      except (IOError, HeaderError) as e:
+        print("   Cannot read %s: %s" %(filename, e))
+        continue
+      if not isTextFile(headers):
+        continue
+      try:
+        batch.extend(getTextProducts(headers, data))
+      except (zipfile.BadZipfile, zlib.error) as e:
+        print("   Corrupted ZIP payload in %s: %s" %(filename, e))
+        continue
+      except (NotImplementedError, RuntimeError) as e:
+        # Unsupported compression method or encrypted member
+        print("   Unsupported ZIP payload in %s: %s" %(filename, e))
+        continue
+      if len(batch) >= batchsize:
+        products, batch = batch, []
+        count += _writeProducts(outdir, products)
+  finally:
+    # Products already decoded are written even when a later file aborts the run
+    count += _writeProducts(outdir, batch)
+  return count
+
+def dumpImage(filename, outfilename=None):
+  '''
+    Decodes an image file (filename or file-like object) and saves it next to the input,
+    or with the extension replaced in "outfilename" when given. File-like objects (like
+    archive members) are saved under their base name in the current folder.
+    Returns the name of the saved image, None if the file could not be decoded
+  '''
+  f, name, owned = _openSource(filename)
+  try:
+    hdata = readHeaderChain(f)
+  except HeaderError as e:
+    print("   Header 0 is corrupted for file %s: %s" %(name, e))
+    if owned:
+      f.close()
     return
 
-  f.seek(0, 0)
+  if struct.unpack(">B", hdata[3:4])[0] != 0:
+    print("The file %s is not an image container." %name)
+    if owned:
+      f.close()
+    return
 
-  hdata = f.read(headerlength)
   headers = getHeaderData(hdata)
 
   data = f.read()
 
-  f.close()
+  if owned:
+    f.close()
 
-  compression = -1
+  try:
+    ext, image = decodeImage(headers, data)
+  except ValueError as e:
+    print(e)
+    return
+
+  if outfilename is None:
+    outfilename = name if owned else os.path.basename(name)
+  outfilename = outfilename.replace(".lrit", ext)
+  if isinstance(image, Image.Image):
+    print("Decompressed image. Saving to %s" %outfilename)
+    image.save(outfilename)
+  else:
+    print("%s Image, dumping to %s" %("JPEG" if ext == ".jpg" else "GIF", outfilename))
+    f = open(outfilename, "wb")
+    f.write(image)
+    f.close()
+  return outfilename
 
+def decodeImage(headers, data):
+  '''
+    Decodes the data section of an image file. Returns a tuple (extension, image) where image is
+    the JPEG / GIF content as is, or a PIL Image for uncompressed and Rice (already decompressed) data.
+    Raises ValueError if the format is not supported.
+  '''
+  imagedata = None
   for i in headers:
-    if i["type"] == 0:
-      fileoffset = i["headerlength"]
-      datasize = i["datalength"]
     if i["type"] == 1:
       imagedata = i
-      if compression < i["compression"]:
-        compression = i["compression"]
-    elif i["type"] == 2:
-      projdata = i
-    elif i["type"] == 128:
-      posdata = i
-    elif i["type"] == 129:
-      if compression < i["compression"]:
-        compression = i["compression"]
+  compression = getCompression(headers)
 
   if compression == 2:
-    outfilename = filename.replace(".lrit", ".jpg")
-    print("JPEG Image, dumping to %s" %outfilename)
-    f = open(outfilename, "wb")
-    f.write(data)
-    f.close()
+    return ".jpg", data
   elif compression == 5:
-    outfilename = filename.replace(".lrit", ".gif")
-    print("GIF Image, dumping to %s" %outfilename)
-    f = open(outfilename, "wb")
-    f.write(data)
-    f.close()
+    return ".gif", data
   elif compression == 1 or compression == 0:
-    outfilename = filename.replace(".lrit", ".jpg")
-    print("Decompressed image. Saving to %s" %outfilename)
+    if imagedata is None:
+      raise ValueError("No Image Structure Header")
     if imagedata["bitsperpixel"] == 8:
       if len(data) < imagedata["columns"] * imagedata["lines"]:
         msbytes = (imagedata["columns"] * imagedata["lines"]) - len(data)
         print("Missing %s bytes on image." %msbytes)
-        data += "\x00" * msbytes
+        data = bytes(data) + b"\x00" * msbytes
       im = Image.frombuffer("L", (imagedata["columns"], imagedata["lines"]), data, 'raw', "L", 0, 1)
-      im.save(outfilename)
     elif imagedata["bitsperpixel"] == 1:
       if imagedata["columns"] % 8 != 0:
         im = Image.new("1", (imagedata["columns"], imagedata["lines"]))
@@ -664,7 +1442,8 @@ def dumpImage(filename):
               break
       else:
         im = Image.frombuffer("1", (imagedata["columns"], imagedata["lines"]), data, 'raw', "1", 0, 1)
-
-      im.save(outfilename)
     else:
-      print("BPP not supported: %s" %imagedata["bitsperpixel"])
\ No newline at end of file
+      raise ValueError("BPP not supported: %s" %imagedata["bitsperpixel"])
+    return ".jpg", im
+  else:
+    raise ValueError("Compression not supported: %s" %compression)
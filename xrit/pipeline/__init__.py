@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+import os, io, time, struct, binascii
+from multiprocessing import Process, Queue, shared_memory
+from multiprocessing import resource_tracker
+try:
+  from queue import Empty
+except ImportError:
+  from Queue import Empty
+from xrit.packetmanager import *
+from xrit.packetmanager import _freeTarget
+from xrit.dedup import Deduplicator, hashBuffer
+from PIL import Image
+
+'''
+  Multi-process read -> parse -> decode -> write pipeline.
+  Stages hand over the file contents in multiprocessing.shared_memory blocks, only the block
+  name and the (small) header list go through the queues. The last stage using a block unlinks it.
+  Blocks are named after the run and the stage that created them, so the runner can unlink the
+  ones left behind if a stage dies. Requires Python 3.8+
+'''
+
+def _newMetrics(stage):
+  return {"stage": stage, "items": 0, "bytes": 0, "errors": 0, "duplicates": 0, "busy": 0.0, "wait": 0.0, "start": time.time()}
+
+def _get(q, metrics):
+  t = time.time()
+  item = q.get()
+  metrics["wait"] += time.time() - t
+  return item
+
+def _put(q, item, metrics):
+  t = time.time()
+  q.put(item)
+  metrics["wait"] += time.time() - t
+
+def _finish(metrics, q):
+  metrics["elapsed"] = time.time() - metrics["start"]
+  q.put(metrics)
+
+def _blockName(run, stage, worker, n):
+  return "%s%s%s_%s" %(run, stage, worker, n)
+
+def _unlinkBlocks(names):
+  count = 0
+  for name in names:
+    try:
+      shm = shared_memory.SharedMemory(name=name)
+    except (IOError, OSError):
+      continue
+    shm.close()
+    shm.unlink()
+    count += 1
+  return count
+
+def _readStage(filenames, out, metricsq, consumers, run):
+  m = _newMetrics("read")
+  for n, filename in enumerate(filenames):
+    t = time.time()
+    try:
+      size = os.path.getsize(filename)
+      if size == 0:
+        raise IOError("empty file")
+      shm = shared_memory.SharedMemory(name=_blockName(run, "r", 0, n), create=True, size=size)
+      try:
+        with open(filename, "rb") as f:
+          size = f.readinto(shm.buf)
+      except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+      name = shm.name
+      shm.close()
+    except (IOError, OSError) as e:
+      print("   Cannot read %s: %s" %(filename, e))
+      m["errors"] += 1
+      m["busy"] += time.time() - t
+      continue
+    m["items"] += 1
+    m["bytes"] += size
+    m["busy"] += time.time() - t
+    _put(out, (filename, name, size), m)
+
+  for i in range(consumers):
+    _put(out, None, m)
+  _finish(m, metricsq)
+
+def _parseStage(inq, out, metricsq, consumers, seenfile):
+  m = _newMetrics("parse")
+  dedup = Deduplicator(seenfile) if seenfile is not None else None
+  # Hashes handed over in this run, they only reach the seen file once written
+  pending = set()
+  while True:
+    item = _get(inq, m)
+    if item is None:
+      break
+    t = time.time()
+    filename, name, size = item
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+      primary = bytes(shm.buf[:16])
+      if size < 16 or primary[:3] != b"\x00\x00\x10":
+        raise HeaderError("no primary header", 0)
+      headerlength = struct.unpack(">I", primary[4:8])[0]
+      headers, errors = decodeHeaders(bytes(shm.buf[:min(headerlength, size)]), True)
+    except HeaderError as e:
+      print("   Header is corrupted for file %s: %s" %(filename, e))
+      m["errors"] += 1
+      shm.close()
+      shm.unlink()
+      m["busy"] += time.time() - t
+      continue
+    key = hashBuffer(shm.buf[:size], headerlength) if dedup is not None else None
+    if key is not None and (dedup.checkHash(key) or key in pending):
+      m["duplicates"] += 1
+      shm.close()
+      shm.unlink()
+      m["busy"] += time.time() - t
+      continue
+    if key is not None:
+      pending.add(key)
+    shm.close()
+    m["items"] += 1
+    m["bytes"] += size
+    m["busy"] += time.time() - t
+    _put(out, (filename, name, size, headerlength, headers, key), m)
+
+  for i in range(consumers):
+    _put(out, None, m)
+  if dedup is not None:
+    dedup.close()
+  _finish(m, metricsq)
+
+def decodeOutputs(filename, headers, data):
+  '''
+    Decodes the data section of a file into a list of (outputname, content) ready to be written.
+    Images are saved as JPEG / GIF, DCS files as a text table, text files as their products
+    and everything else as the raw data section.
+  '''
+  base = os.path.splitext(os.path.basename(filename))[0]
+  filetypecode = HeaderInfo(headers).filetypecode
+  if filetypecode == 0:
+    ext, image = decodeImage(headers, data)
+    if isinstance(image, Image.Image):
+      out = io.BytesIO()
+      image.save(out, "JPEG")
+      image = out.getvalue()
+    return [(base + ext, image)]
+  if filetypecode == 130:
+    h, t = parseDCS(bytes(data))
+    return [(base + ".txt", "\n".join(formatDCS(h, t)).encode("utf-8"))]
+  if isTextFile(headers):
+    return getTextProducts(headers, bytes(data))
+  return [(base + ".bin", data)]
+
+def _storeOutputs(outputs, name):
+  '''
+    Copies the decoder outputs into a new shared memory block "name". Returns the block name
+    (None if there is nothing to write) and the list of (outputname, offset, length) inside it
+  '''
+  total = sum(len(content) for outputname, content in outputs)
+  if total == 0:
+    return None, [(outputname, 0, 0) for outputname, content in outputs]
+  block = shared_memory.SharedMemory(name=name, create=True, size=total)
+  entries = []
+  offset = 0
+  for outputname, content in outputs:
+    block.buf[offset:offset+len(content)] = content
+    entries.append((outputname, offset, len(content)))
+    offset += len(content)
+  name = block.name
+  block.close()
+  return name, entries
+
+def _decodeFile(filename, shm, size, headerlength, headers, outname):
+  # No reference to the block view may outlive this call, or the block cannot be closed
+  return _storeOutputs(decodeOutputs(filename, headers, shm.buf[headerlength:size]), outname)
+
+def _decodeStage(inq, out, metricsq, run, worker):
+  m = _newMetrics("decode")
+  n = 0
+  while True:
+    item = _get(inq, m)
+    if item is None:
+      break
+    t = time.time()
+    filename, name, size, headerlength, headers, key = item
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+      outname, entries = _decodeFile(filename, shm, size, headerlength, headers, _blockName(run, "d", worker, n))
+      n += 1
+    except Exception as e:
+      print("   Cannot decode %s: %s" %(filename, e))
+      m["errors"] += 1
+      entries = None
+    shm.close()
+    shm.unlink()
+    m["busy"] += time.time() - t
+    if entries is None:
+      continue
+    m["items"] += 1
+    m["bytes"] += size - headerlength
+    _put(out, (filename, outname, entries, key), m)
+
+  _put(out, None, m)
+  _finish(m, metricsq)
+
+def _writeStage(inq, outdir, metricsq, producers, seenfile):
+  m = _newMetrics("write")
+  dedup = Deduplicator(seenfile) if seenfile is not None else None
+  claimed = set()
+  done = 0
+  while done < producers:
+    item = _get(inq, m)
+    if item is None:
+      done += 1
+      continue
+    t = time.time()
+    filename, name, entries, key = item
+    shm = shared_memory.SharedMemory(name=name) if name is not None else None
+    try:
+      for outputname, offset, length in entries:
+        target = _freeTarget(os.path.join(outdir, outputname), claimed)
+        claimed.add(target)
+        with open(target, "wb") as f:
+          if length > 0:
+            f.write(shm.buf[offset:offset+length])
+        m["bytes"] += length
+      # Only files whose outputs were all written count as seen
+      if key is not None:
+        dedup.commit(key)
+    except (IOError, OSError) as e:
+      print("   Cannot write outputs of %s: %s" %(filename, e))
+      m["errors"] += 1
+    if shm is not None:
+      shm.close()
+      shm.unlink()
+    m["items"] += 1
+    m["busy"] += time.time() - t
+  if dedup is not None:
+    dedup.close()
+  _finish(m, metricsq)
+
+def _mergeMetrics(metrics):
+  merged = []
+  for stage in ("read", "parse", "decode", "write"):
+    parts = [i for i in metrics if i["stage"] == stage]
+    if len(parts) == 0:
+      continue
+    s = {"stage": stage, "workers": len(parts)}
+    for key in ("items", "bytes", "errors", "duplicates", "busy", "wait"):
+      s[key] = sum(i[key] for i in parts)
+    s["elapsed"] = max(i["elapsed"] for i in parts)
+    s["rate"] = s["items"] / s["elapsed"] if s["elapsed"] > 0 else 0.0
+    s["throughput"] = s["bytes"] / s["elapsed"] if s["elapsed"] > 0 else 0.0
+    s["utilization"] = s["busy"] / (s["elapsed"] * s["workers"]) if s["elapsed"] > 0 else 0.0
+    merged.append(s)
+  return merged
+
+def runPipeline(filenames, outdir, decoders=1, queuesize=16, seenfile=None):
+  '''
+    Processes "filenames" in a read -> parse -> decode -> write pipeline of separate processes
+    and writes the decoded outputs to "outdir". "decoders" is the number of decode processes
+    and "queuesize" bounds the files waiting between stages, so a slow stage throttles the
+    ones before it. If "seenfile" is given the parse stage drops files whose content hash is
+    already in it (see xrit.dedup), and the write stage adds the hashes of the files whose
+    outputs were written. Returns the per stage metrics.
+  '''
+  # Make sure every stage registers its blocks in the same tracker
+  resource_tracker.ensure_running()
+  filenames = list(filenames)
+  run = "xr%s_" %binascii.hexlify(os.urandom(4)).decode("ascii")
+
+  readq = Queue(queuesize)
+  parseq = Queue(queuesize)
+  writeq = Queue(queuesize)
+  metricsq = Queue()
+
+  procs = [
+    Process(target=_readStage, args=(filenames, readq, metricsq, 1, run)),
+    Process(target=_parseStage, args=(readq, parseq, metricsq, decoders, seenfile)),
+    Process(target=_writeStage, args=(writeq, outdir, metricsq, decoders, seenfile))
+  ]
+  for i in range(decoders):
+    procs.append(Process(target=_decodeStage, args=(parseq, writeq, metricsq, run, i)))
+
+  for p in procs:
+    p.start()
+
+  metrics = []
+  failed = False
+  while len(metrics) < len(procs):
+    try:
+      metrics.append(metricsq.get(timeout=1))
+    except Empty:
+      # A dead stage leaves the ones before it blocked on a full queue
+      if any(p.exitcode not in (None, 0) for p in procs) or not any(p.is_alive() for p in procs):
+        failed = True
+        break
+
+  if failed:
+    for p in procs:
+      if p.is_alive():
+        p.terminate()
+  for p in procs:
+    p.join()
+  if failed:
+    names = [_blockName(run, "r", 0, n) for n in range(len(filenames))]
+    for i in range(decoders):
+      names.extend(_blockName(run, "d", i, n) for n in range(len(filenames)))
+    leaked = _unlinkBlocks(names)
+    print("   Pipeline stage died, stopped the pipeline and released %s shared memory blocks, metrics are incomplete" %leaked)
+  return _mergeMetrics(metrics)
+
+def printMetrics(metrics):
+  '''
+    Prints the per stage metrics returned by runPipeline
+  '''
+  print(" Stage   Workers   Files   Errors   Duplicates   Files/s      MB/s   Busy %   Waiting (s)")
+  for s in metrics:
+    print(" %-6s  %7s  %6s   %6s   %10s  %8.1f  %8.2f   %5.1f   %11.2f" % (s["stage"], s["workers"], s["items"], s["errors"], s["duplicates"], s["rate"], s["throughput"] / 1e6, s["utilization"] * 100, s["wait"]))
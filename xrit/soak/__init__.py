@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+import os, io, sys, time, random, shutil, struct, tempfile, zipfile
+from xrit.packetmanager import *
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+'''
+  Soak harness: replays a corpus of lrit/hrit files through the library entry points
+  (parseFile, loadData, parseDCS, dumpImage, getTextProducts) at a fixed rate and tracks latency percentiles,
+  throughput, memory (RSS) growth and open file descriptors over time.
+'''
+
+_clock = getattr(time, "perf_counter", time.time)
+
+'''
+  Number of latency samples kept per operation for the whole run percentiles
+'''
+RESERVOIR_SIZE = 10000
+
+def getRSS():
+  '''
+    Returns the current resident set size in bytes. Falls back to the peak RSS where
+    /proc is not available, and to 0 where neither is.
+  '''
+  try:
+    with open("/proc/self/status") as f:
+      for line in f:
+        if line.startswith("VmRSS:"):
+          return int(line.split()[1]) * 1024
+  except IOError:
+    pass
+  if resource is None:
+    return 0
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak if sys.platform == "darwin" else peak * 1024
+
+def getOpenFiles():
+  '''
+    Returns the number of open file descriptors of this process, None if unknown
+  '''
+  for folder in ("/proc/self/fd", "/dev/fd"):
+    if os.path.isdir(folder):
+      return len(os.listdir(folder))
+  return None
+
+def percentile(samples, p):
+  '''
+    Returns the "p" (0-100) percentile of a list of samples, None if it is empty
+  '''
+  if len(samples) == 0:
+    return None
+  samples = sorted(samples)
+  return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))]
+
+class _Reservoir(object):
+  '''
+    Uniform random sample of at most "size" values out of all the added ones
+  '''
+  def __init__(self, size):
+    self.size = size
+    self.samples = []
+    self.count = 0
+
+  def add(self, value):
+    self.count += 1
+    if len(self.samples) < self.size:
+      self.samples.append(value)
+    else:
+      i = random.randint(0, self.count - 1)
+      if i < self.size:
+        self.samples[i] = value
+
+def buildRecord(type, payload):
+  '''
+    Returns a header record of "type" with "payload"
+  '''
+  return struct.pack(">BH", type, len(payload) + 3) + payload
+
+def buildFile(data=b"", records=(), filetypecode=0, name=b"test.lrit", product=13, subproduct=1, compression=0, days=21000, ms=0):
+  '''
+    Returns a whole synthetic file: primary header, "records", annotation (unless "name" is None),
+    timestamp and NOAA specific records, then "data"
+  '''
+  body = b"".join(records)
+  if name is not None:
+    body += buildRecord(4, name)
+  body += buildRecord(5, b"\x00" + struct.pack(">HI", days, ms))
+  body += buildRecord(129, struct.pack(">4sHHHB", b"NOAA", product, subproduct, 0, compression))
+  return buildRecord(0, struct.pack(">BIQ", filetypecode, 16 + len(body), len(data) * 8)) + body + data
+
+def buildZipPayload(members):
+  '''
+    Returns a ZIP archive holding the (name, content) "members", as carried by EMWIN files
+  '''
+  out = io.BytesIO()
+  z = zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED)
+  for name, content in members:
+    z.writestr(name, content)
+  z.close()
+  return out.getvalue()
+
+def _bulletin(rnd, n):
+  return b"\x01\r\r\nSXUS72 KWBC 191200\r\r\nSVRGSG\r\r\n" + b"TEXT PRODUCT " * rnd.randint(10, 500) + b"\r\r\n\x03"
+
+def buildSyntheticCorpus(directory, count=100, seed=0):
+  '''
+    Writes "count" synthetic files to "directory" with a mix of uncompressed images with
+    navigation and structured records, JPEG images, DCS, text files with ancillary text and
+    EMWIN files with ZIP payloads. Returns the list of filenames.
+  '''
+  rnd = random.Random(seed)
+  files = []
+  for n in range(count):
+    kind = n % 5
+    days = 21000 + n // 1000
+    ms = (n * 1000) % 86400000
+    name = ("synthetic%05d.lrit" % n).encode("ascii")
+    if kind == 0:
+      columns = 8 * rnd.randint(16, 128)
+      lines = rnd.randint(16, 128)
+      data = bytes(bytearray(rnd.randint(0, 255) for i in range(columns))) * lines
+      records = [
+        buildRecord(1, struct.pack(">BHHB", 8, columns, lines, 0)),
+        buildRecord(2, struct.pack(">32sIIII", b"GEOS(-075.0)", 40932549, 40932549, columns // 2, lines // 2)),
+        buildRecord(128, struct.pack(">7H", n, 0, 0, 0, 1, columns, lines)),
+        buildRecord(130, b"UI0UIsynthetic%dUI" %n)
+      ]
+      content = buildFile(data, records, 0, name, 13, 1, 0, days, ms)
+    elif kind == 1:
+      data = b"\xff\xd8\xff\xe0" + b"\x00" * rnd.randint(1000, 20000) + b"\xff\xd9"
+      records = [buildRecord(1, struct.pack(">BHHB", 8, 100, 100, 2))]
+      content = buildFile(data, records, 0, name, 16, 13, 2, days, ms)
+    elif kind == 2:
+      message = b"ABCDEF12 17005160040G45+0NN0123UP" + b"DCS MESSAGE DATA " * rnd.randint(1, 20)
+      data = b" " * 64 + b"".join(b"\x02\x02\x18" + message for i in range(rnd.randint(1, 50)))
+      content = buildFile(data, [], 130, name, 8, 0, 0, days, ms)
+    elif kind == 3:
+      data = b"".join(_bulletin(rnd, n) for i in range(rnd.randint(1, 5)))
+      records = [buildRecord(6, b"Time of frame start = 2020-01-01;Product = synthetic %d;Flag" %n)]
+      content = buildFile(data, records, 2, name, 1, 0, 0, days, ms)
+    else:
+      data = buildZipPayload([("A_BUNDLE%d.TXT" %n, b"".join(_bulletin(rnd, n) for i in range(rnd.randint(1, 5))))])
+      records = [buildRecord(6, b"Compression = ZIP;Product = EMWIN")]
+      content = buildFile(data, records, 214, name, 42, 0, 10, days, ms)
+
+    filename = os.path.join(directory, name.decode("ascii"))
+    with open(filename, "wb") as f:
+      f.write(content)
+    files.append(filename)
+  return files
+
+def _operations(filename, scratch):
+  '''
+    Returns the list of (name, function) exercised for a file, following the executables:
+    xritparse for every file, xritimg for images, xritpdcs for DCS files and xrittext
+    for text files
+  '''
+  try:
+    headers = loadHeaderInfo(filename).headers
+  except (IOError, HeaderError):
+    headers = []
+  filetypecode = headers[0]["filetypecode"] if len(headers) > 0 else None
+  outfilename = os.path.join(scratch, os.path.basename(filename))
+  operations = [
+    ("parseFile", lambda: parseFile(filename, True, True)),
+    ("loadData", lambda: loadData(filename))
+  ]
+  if filetypecode == 0:
+    operations.append(("dumpImage", lambda: dumpImage(filename, outfilename)))
+  elif filetypecode == 130:
+    operations.append(("parseDCS", lambda: parseDCS(loadData(filename))))
+  elif isTextFile(headers):
+    operations.append(("textProducts", lambda: getTextProducts(*loadFile(filename))))
+  return operations
+
+class SoakRun(object):
+  '''
+    Replays "files" in a loop at "rate" files per second (as fast as possible if None) for
+    "duration" seconds, printing a report every "interval" seconds.
+    Outputs of dumpImage go to "scratch" and the library output is discarded.
+  '''
+  def __init__(self, files, scratch, duration=3600, rate=None, interval=60):
+    self.files = files
+    self.scratch = scratch
+    self.duration = duration
+    self.rate = rate
+    self.interval = interval
+    self.latencies = {}
+    self.window = {}
+    self.errors = {}
+    self.lastErrors = {}
+    self.processed = 0
+    self.reports = []
+
+  def _call(self, name, function):
+    stdout = sys.stdout
+    sys.stdout = self._devnull
+    t = _clock()
+    try:
+      function()
+    except Exception as e:
+      self.errors[name] = self.errors.get(name, 0) + 1
+      self.lastErrors[name] = "%s: %s" %(e.__class__.__name__, e)
+    finally:
+      elapsed = _clock() - t
+      sys.stdout = stdout
+    if name not in self.latencies:
+      self.latencies[name] = _Reservoir(RESERVOIR_SIZE)
+      self.window[name] = []
+    self.latencies[name].add(elapsed)
+    self.window[name].append(elapsed)
+
+  def _report(self, start, windowstart, windowfiles):
+    now = time.time()
+    rss = getRSS()
+    fds = getOpenFiles()
+    report = {
+      "elapsed": now - start,
+      "files": self.processed,
+      "throughput": windowfiles / (now - windowstart) if now > windowstart else 0.0,
+      "rss": rss,
+      "rssgrowth": rss - self.baseRSS,
+      "openfiles": fds,
+      "leakedfiles": fds - self.baseFiles if fds is not None and self.baseFiles is not None else None,
+      "latency": {},
+      "errors": dict(self.errors),
+      "lasterrors": dict(self.lastErrors)
+    }
+    for name in sorted(self.window):
+      report["latency"][name] = dict((p, percentile(self.window[name], p)) for p in (50, 95, 99))
+      self.window[name] = []
+    self.reports.append(report)
+    printReport(report)
+    return report
+
+  def run(self):
+    '''
+      Runs the soak test and returns the final report, with latency percentiles over the whole run
+    '''
+    operations = [_operations(i, self.scratch) for i in self.files]
+    self._devnull = open(os.devnull, "w")
+    self.baseRSS = getRSS()
+    self.baseFiles = getOpenFiles()
+    start = time.time()
+    windowstart = start
+    windowfiles = 0
+    n = 0
+    while time.time() - start < self.duration:
+      if self.rate:
+        delay = start + float(n) / self.rate - time.time()
+        if delay > 0:
+          time.sleep(delay)
+      for name, function in operations[n % len(operations)]:
+        self._call(name, function)
+      n += 1
+      self.processed += 1
+      windowfiles += 1
+      if time.time() - windowstart >= self.interval:
+        self._report(start, windowstart, windowfiles)
+        windowstart = time.time()
+        windowfiles = 0
+
+    if windowfiles > 0 or len(self.reports) == 0:
+      self._report(start, windowstart, windowfiles)
+    final = dict(self.reports[-1])
+    self._devnull.close()
+    final["latency"] = {}
+    final["throughput"] = self.processed / final["elapsed"] if final["elapsed"] > 0 else 0.0
+    for name in sorted(self.latencies):
+      final["latency"][name] = dict((p, percentile(self.latencies[name].samples, p)) for p in (50, 95, 99))
+    return final
+
+def printReport(report):
+  '''
+    Prints a report from SoakRun
+  '''
+  leaked = report["leakedfiles"] if report["leakedfiles"] is not None else "?"
+  print("[%8.0fs] %s files, %.1f files/s, RSS %.1f MB (%+.1f MB), open files %s (%+s)" % (report["elapsed"], report["files"], report["throughput"], report["rss"] / 1e6, report["rssgrowth"] / 1e6, report["openfiles"], leaked))
+  for name in sorted(report["latency"]):
+    l = report["latency"][name]
+    if l[50] is None:
+      continue
+    print("   %-12s p50 %8.2f ms   p95 %8.2f ms   p99 %8.2f ms   errors %s" % (name, l[50] * 1000, l[95] * 1000, l[99] * 1000, report["errors"].get(name, 0)))
+    if name in report["lasterrors"]:
+      print("                last error: %s" %report["lasterrors"][name])
+
+def runSoak(files=None, duration=3600, rate=None, interval=60, synthetic=100):
+  '''
+    Runs a soak test over "files", or over "synthetic" generated files if no files are given.
+    Returns the final report.
+  '''
+  workdir = tempfile.mkdtemp(prefix="xritsoak")
+  try:
+    scratch = os.path.join(workdir, "out")
+    os.mkdir(scratch)
+    if not files:
+      corpus = os.path.join(workdir, "corpus")
+      os.mkdir(corpus)
+      files = buildSyntheticCorpus(corpus, synthetic)
+    print("Soak test over %s files for %s seconds, work folder %s" %(len(files), duration, workdir))
+    final = SoakRun(files, scratch, duration, rate, interval).run()
+  finally:
+    shutil.rmtree(workdir, ignore_errors=True)
+  print("Whole run:")
+  printReport(final)
+  return final